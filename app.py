@@ -7,11 +7,49 @@ Versión 9.1 - Más robusto
 Autor: Lizbeth Ramírez | PROA - Ecommerce
 """
 
+import os
+import time
+
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 
+from graficos import (
+    COLORS,
+    CacheFiguras,
+    grafico_coincidencias,
+    grafico_mensajes_error,
+    grafico_por_hora,
+    grafico_por_tipo,
+    grafico_serie_temporal,
+    grafico_severidad,
+    grafico_tendencia_diaria,
+)
+
+from nucleo import (
+    DIR_INSTANTANEAS,
+    FORMATOS_EXPORTACION,
+    FUENTES_DATOS,
+    MESES_ES,
+    CacheExportaciones,
+    IngestaMultiple,
+    Refrescador,
+    conteo_diario,
+    crear_fuentes,
+    filas_explorador,
+    filtrar_cubo,
+    kpis,
+    metricas_resumen,
+    obtener_meses_disponibles,
+    pagina_tabla,
+    rango_fechas_cubo,
+    reporte_memoria,
+    serie_horaria,
+    serie_temporal,
+    total_por,
+)
+from perfilado import Perfilador, capturar_cprofile, configurar_logs, tamaño_payload
+from precalculo import DIR_VISTAS, SEVERIDADES_VISTA, VistasMes, precalcular
+
 # ============================================
 # CONFIGURACIÓN
 # ============================================
@@ -22,36 +60,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# ============================================
-# 🔗 TU GOOGLE SHEET
-# ============================================
-GOOGLE_SHEET_ID = "1ycVV-aBUBhlPdJk9s3wSvaZflyMbSpmG1OpmB9rZof8"
-GOOGLE_SHEET_URL = f"https://docs.google.com/spreadsheets/d/{GOOGLE_SHEET_ID}/export?format=csv"
-
-# ============================================
-# COLORES PROA
-# ============================================
-COLORS = {
-    'bg_dark': '#0A1628',
-    'bg_card': '#0D1B2A',
-    'border': '#1B3A5C',
-    'blue': '#0066B3',
-    'blue_light': '#3B9EE8',
-    'cyan': '#00B4D8',
-    'white': '#FFFFFF',
-    'gray': '#8B9AAF',
-    'green': '#10B981',
-    'yellow': '#F59E0B',
-    'red': '#EF4444',
-}
-
-# Nombres de meses en español
-MESES_ES = {
-    1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril',
-    5: 'Mayo', 6: 'Junio', 7: 'Julio', 8: 'Agosto',
-    9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
-}
-
 # ============================================
 # CSS
 # ============================================
@@ -149,45 +157,116 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # ============================================
-# CARGAR DATOS DESDE GOOGLE SHEETS
+# CARGAR DATOS
 # ============================================
-@st.cache_data(ttl=300)
+@st.cache_resource
+def obtener_refrescador():
+    """Estado de ingesta (todas las fuentes) y refrescador compartidos por todo el proceso.
+
+    Tras cada refresco se precalculan en segundo plano las vistas de los
+    meses cerrados que no tengan una al día.
+    """
+    despues = (lambda instantanea: precalcular(instantanea, DIR_VISTAS)) if DIR_VISTAS else None
+    return Refrescador(IngestaMultiple(crear_fuentes(FUENTES_DATOS), DIR_INSTANTANEAS), despues=despues).iniciar()
+
 def cargar_google_sheet():
-    """Carga datos desde Google Sheets"""
-    try:
-        df = pd.read_csv(GOOGLE_SHEET_URL)
-        
-        if 'fecha' in df.columns:
-            df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+    """Devuelve la última instantánea buena; solo bloquea en la primera carga"""
+    refrescador = obtener_refrescador()
+    if refrescador.estado.instantanea is None:
+        refrescador.asegurar_primera_carga()
+    
+    if refrescador.estado.instantanea is None:
+        return None, refrescador.ultimo_error
+    return refrescador.estado.instantanea, None
+
+@st.cache_resource
+def obtener_cache_exportaciones():
+    """Caché de exportaciones compartida por todo el proceso"""
+    return CacheExportaciones()
+
+@st.cache_resource
+def obtener_vistas():
+    """Vistas precalculadas de los meses cerrados, compartidas por todas las sesiones"""
+    return VistasMes(DIR_VISTAS)
+
+@st.cache_resource
+def obtener_cache_figuras():
+    """Caché de figuras compartida por todas las sesiones"""
+    return CacheFiguras()
+
+# ============================================
+# DEPURACIÓN
+# ============================================
+def modo_depuracion():
+    """Panel de depuración oculto: ?debug=1 en la URL o DASHBOARD_DEBUG=1"""
+    return st.query_params.get('debug') == '1' or os.environ.get('DASHBOARD_DEBUG') == '1'
+
+# Gráficos en los que un clic en una barra filtra por su valor (drill-down)
+DRILL_GRAFICOS = {
+    'grafico_por_tipo': 'tipo_error',
+    'grafico_por_hora': 'hora',
+    'grafico_mensajes_error': 'plantilla',
+}
+NOMBRES_DRILL = {'tipo_error': 'Tipo', 'hora': 'Hora', 'plantilla': 'Mensaje'}
+
+def aplicar_clic(nombre):
+    """Callback de la selección en un gráfico: fija su dimensión a los valores elegidos"""
+    valores = set()
+    for punto in st.session_state[nombre].selection.points:
+        valor = punto.get('customdata')
+        if isinstance(valor, list):
+            valor = valor[0] if valor else None
+        if valor is not None:
+            valores.add(int(valor) if DRILL_GRAFICOS[nombre] == 'hora' else valor)
+    if valores:
+        st.session_state.setdefault('drill', {})[DRILL_GRAFICOS[nombre]] = sorted(valores)
+
+def quitar_drill(dimension=None):
+    """Quita el drill-down de una dimensión, o de todas"""
+    drill = st.session_state.setdefault('drill', {})
+    if dimension is None:
+        drill.clear()
+    else:
+        drill.pop(dimension, None)
+
+def mostrar_grafico(construir, perfilador, nombre, filtros, vista=None):
+    """Envía la figura al navegador, midiendo el envío y su tamaño.
+
+    La figura solo se construye si no está en caché para los mismos datos
+    y filtros, ni en la `vista` precalculada del mes; el tema es el de la
+    propia figura (`PLANTILLA`). En los de `DRILL_GRAFICOS` un clic filtra.
+    """
+    if vista and nombre in vista['figuras']:
+        fig = vista['figuras'][nombre]
+    else:
+        fig = obtener_cache_figuras().obtener((nombre,) + filtros, construir)
+    if not fig:
+        return
+    with perfilador.etapa(f"{nombre} (envío)") as registro:
+        if nombre in DRILL_GRAFICOS:
+            st.plotly_chart(fig, use_container_width=True, theme=None, key=nombre,
+                            on_select=lambda: aplicar_clic(nombre), selection_mode='points')
+        else:
+            st.plotly_chart(fig, use_container_width=True, theme=None)
+    if perfilador.activo:
+        registro['bytes'] = tamaño_payload(fig)
+
+def render_panel_depuracion(perfilador, cprofile):
+    with st.sidebar.expander("🛠️ Depuración", expanded=True):
+        tabla = perfilador.tabla()
+        st.caption(f"Rerun {perfilador.rerun} · {tabla['ms'].sum():,.0f} ms medidos")
+        st.dataframe(tabla, use_container_width=True, hide_index=True)
         
-        df = df.dropna(how='all')
+        if st.button("📸 Capturar cProfile del siguiente rerun"):
+            st.session_state['capturar_cprofile'] = True
+            st.rerun()
         
-        return df, None
-    except Exception as e:
-        return None, str(e)
-
-def obtener_meses_disponibles(df):
-    """Obtiene lista de meses disponibles en los datos"""
-    meses = []
-    try:
-        if df is not None and 'fecha' in df.columns:
-            df_fechas = df.dropna(subset=['fecha'])
-            if len(df_fechas) > 0:
-                df_fechas['año'] = df_fechas['fecha'].dt.year
-                df_fechas['mes'] = df_fechas['fecha'].dt.month
-                
-                combinaciones = df_fechas[['año', 'mes']].drop_duplicates()
-                combinaciones = combinaciones.sort_values(['año', 'mes'], ascending=[False, False])
-                
-                for _, row in combinaciones.iterrows():
-                    año = int(row['año'])
-                    mes = int(row['mes'])
-                    nombre = f"{MESES_ES.get(mes, mes)} {año}"
-                    meses.append({'nombre': nombre, 'año': año, 'mes': mes})
-    except Exception as e:
-        st.error(f"Error obteniendo meses: {e}")
-    
-    return meses
+        if cprofile:
+            st.session_state['ultimo_cprofile'] = cprofile
+        ultimo = st.session_state.get('ultimo_cprofile')
+        if ultimo:
+            st.code(ultimo['texto'], language=None)
+            st.download_button("📥 Descargar .prof", ultimo['prof'], "rerun.prof", "application/octet-stream")
 
 # ============================================
 # COMPONENTES UI
@@ -206,12 +285,13 @@ def render_header(errores_mes):
     </div>
     """, unsafe_allow_html=True)
 
-def render_kpis(df):
-    total = len(df)
-    criticos = len(df[df['severidad'] == 'CRITICA']) if 'severidad' in df.columns else 0
-    altos = len(df[df['severidad'] == 'ALTA']) if 'severidad' in df.columns else 0
-    medios = len(df[df['severidad'] == 'MEDIA']) if 'severidad' in df.columns else 0
-    bajos = len(df[df['severidad'] == 'BAJA']) if 'severidad' in df.columns else 0
+def render_kpis(cubo, valores=None):
+    valores = valores or kpis(cubo)
+    total = valores['total']
+    criticos = valores['criticos']
+    altos = valores['altos']
+    medios = valores['medios']
+    bajos = valores['bajos']
     
     col1, col2, col3, col4, col5 = st.columns(5)
     
@@ -255,188 +335,37 @@ def render_kpis(df):
         </div>
         """, unsafe_allow_html=True)
 
-# ============================================
-# GRÁFICOS
-# ============================================
-def grafico_tendencia_diaria(df):
-    """Tendencia diaria del mes seleccionado"""
-    if 'fecha' not in df.columns:
-        return None
-    
-    df_temp = df.dropna(subset=['fecha']).copy()
-    if len(df_temp) == 0:
-        return None
-    
-    df_temp['dia'] = df_temp['fecha'].dt.day
-    por_dia = df_temp.groupby('dia').size().reset_index(name='Errores')
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=por_dia['dia'],
-        y=por_dia['Errores'],
-        mode='lines+markers',
-        line=dict(color=COLORS['cyan'], width=2),
-        marker=dict(size=6),
-        fill='tozeroy',
-        fillcolor='rgba(0, 180, 216, 0.1)'
-    ))
-    
-    fig.update_layout(
-        title='📅 Errores por Día del Mes',
-        xaxis=dict(title='Día', gridcolor=COLORS['border'], tickmode='linear', dtick=1),
-        yaxis=dict(title='', gridcolor=COLORS['border']),
-        height=350,
-        plot_bgcolor=COLORS['bg_card'],
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color=COLORS['white'])
-    )
-    return fig
-
-def grafico_por_tipo(df):
-    if 'tipo_error' not in df.columns:
-        return None
-    
-    conteo = df['tipo_error'].value_counts().head(10).reset_index()
-    conteo.columns = ['Tipo', 'Cantidad']
-    
-    if len(conteo) == 0:
-        return None
-    
-    fig = go.Figure(go.Bar(
-        x=conteo['Cantidad'],
-        y=conteo['Tipo'],
-        orientation='h',
-        marker=dict(color=conteo['Cantidad'], colorscale=[[0, COLORS['blue']], [1, COLORS['cyan']]]),
-        text=conteo['Cantidad'],
-        textposition='auto'
-    ))
-    
-    fig.update_layout(
-        title='📊 Top 10 Tipos de Error',
-        xaxis=dict(title='', gridcolor=COLORS['border']),
-        yaxis=dict(title='', categoryorder='total ascending'),
-        height=400,
-        plot_bgcolor=COLORS['bg_card'],
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color=COLORS['white'])
-    )
-    return fig
-
-def grafico_severidad(df):
-    if 'severidad' not in df.columns:
-        return None
-    
-    conteo = df['severidad'].value_counts().reset_index()
-    conteo.columns = ['Severidad', 'Cantidad']
-    
-    if len(conteo) == 0:
-        return None
-    
-    colores_map = {'CRITICA': COLORS['red'], 'ALTA': COLORS['yellow'], 
-                   'MEDIA': COLORS['blue_light'], 'BAJA': COLORS['green']}
-    colores = [colores_map.get(s, COLORS['gray']) for s in conteo['Severidad']]
-    
-    fig = go.Figure(go.Pie(
-        labels=conteo['Severidad'],
-        values=conteo['Cantidad'],
-        hole=0.6,
-        marker=dict(colors=colores)
-    ))
-    
-    fig.update_layout(
-        title='🎯 Distribución por Severidad',
-        height=350,
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color=COLORS['white'])
-    )
-    return fig
-
-def grafico_mensajes_error(df):
-    """Gráfico de los mensajes de error más frecuentes"""
-    if 'error_message' not in df.columns:
-        return None
-    
-    msgs = df['error_message'].dropna()
-    msgs = msgs[msgs != '']
-    
-    if len(msgs) == 0:
-        return None
-    
-    conteo = msgs.value_counts().head(10).reset_index()
-    conteo.columns = ['Mensaje', 'Cantidad']
-    
-    # Truncar mensajes largos
-    conteo['Mensaje_corto'] = conteo['Mensaje'].apply(lambda x: str(x)[:50] + '...' if len(str(x)) > 50 else str(x))
-    
-    fig = go.Figure(go.Bar(
-        x=conteo['Cantidad'],
-        y=conteo['Mensaje_corto'],
-        orientation='h',
-        marker=dict(color=conteo['Cantidad'], colorscale=[[0, COLORS['red']], [1, COLORS['yellow']]]),
-        text=conteo['Cantidad'],
-        textposition='auto',
-        hovertext=conteo['Mensaje'],
-        hoverinfo='text+x'
-    ))
-    
-    fig.update_layout(
-        title='💬 Top 10 Mensajes de Error',
-        xaxis=dict(title='', gridcolor=COLORS['border']),
-        yaxis=dict(title='', categoryorder='total ascending'),
-        height=400,
-        plot_bgcolor=COLORS['bg_card'],
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color=COLORS['white'])
-    )
-    return fig
-
-def grafico_por_hora(df):
-    if 'fecha' not in df.columns:
-        return None
-    
-    df_temp = df.dropna(subset=['fecha']).copy()
-    if len(df_temp) == 0:
-        return None
-    
-    df_temp['hora'] = df_temp['fecha'].dt.hour
-    por_hora = df_temp.groupby('hora').size().reset_index(name='Errores')
-    
-    fig = go.Figure(go.Bar(
-        x=por_hora['hora'],
-        y=por_hora['Errores'],
-        marker=dict(color=por_hora['Errores'], colorscale=[[0, COLORS['blue']], [1, COLORS['cyan']]]),
-        text=por_hora['Errores'],
-        textposition='auto'
-    ))
-    
-    fig.update_layout(
-        title='🕐 Errores por Hora del Día',
-        xaxis=dict(title='Hora', gridcolor=COLORS['border'], tickmode='linear', dtick=2),
-        yaxis=dict(title='', gridcolor=COLORS['border']),
-        height=300,
-        plot_bgcolor=COLORS['bg_card'],
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color=COLORS['white'])
-    )
-    return fig
-
 # ============================================
 # MAIN
 # ============================================
 def main():
+    perfilador = Perfilador(activo=modo_depuracion())
+    capturar = perfilador.activo and st.session_state.pop('capturar_cprofile', False)
+    
+    with perfilador.activar(), capturar_cprofile(capturar) as cprofile:
+        dashboard(perfilador)
+    
+    if perfilador.activo:
+        configurar_logs()
+        perfilador.emitir_logs()
+        render_panel_depuracion(perfilador, cprofile)
+
+def dashboard(perfilador):
     # ========== CARGAR DATOS ==========
-    df_completo, error_carga = cargar_google_sheet()
+    with perfilador.etapa("cargar_google_sheet") as registro:
+        datos, error_carga = cargar_google_sheet()
+        registro['filas'] = datos.filas if datos is not None else 0
     
     if error_carga:
         st.error(f"Error cargando datos: {error_carga}")
         return
     
-    if df_completo is None or len(df_completo) == 0:
+    if datos is None or datos.filas == 0:
         st.warning("No hay datos disponibles en Google Sheets")
         return
     
     # Obtener meses disponibles
-    meses_disponibles = obtener_meses_disponibles(df_completo)
+    meses_disponibles = obtener_meses_disponibles(datos)
     
     # Valores por defecto
     año_actual = datetime.now().year
@@ -458,7 +387,11 @@ def main():
         mes_sel = mes_actual
         
         if meses_disponibles:
-            opciones = [m['nombre'] for m in meses_disponibles]
+            # El total y los críticos de cada mes vienen del catálogo, sin costo extra
+            opciones = [
+                f"{m['nombre']} · {m['filas']:,}" + (f" (🔴 {m['criticos']:,})" if m['criticos'] else "")
+                for m in meses_disponibles
+            ]
             idx_seleccionado = st.selectbox(
                 "Selecciona mes:",
                 range(len(opciones)),
@@ -482,11 +415,45 @@ def main():
             default=['CRITICA', 'ALTA', 'MEDIA', 'BAJA']
         )
         
+        # Solo con más de una fuente (API) configurada
+        filtro_fuente = []
+        if len(datos.fuentes()) > 1:
+            filtro_fuente = st.multiselect("Fuente / API:", datos.fuentes())
+        
+        # Drill-down: se fija con un clic en las barras de tipo, hora o mensaje
+        drill = {dimension: valores for dimension, valores in st.session_state.get('drill', {}).items() if valores}
+        if drill:
+            st.markdown("**🔎 Drill-down**")
+            for dimension, valores in drill.items():
+                texto = ', '.join(str(v) for v in valores)
+                st.button(f"✖ {NOMBRES_DRILL[dimension]}: {texto[:60] + '...' if len(texto) > 60 else texto}",
+                          key=f"quitar_{dimension}", on_click=quitar_drill, args=(dimension,))
+            st.button("Limpiar drill-down", on_click=quitar_drill)
+        else:
+            st.caption("🔎 Clic en una barra de tipo, hora o mensaje para filtrar por ella")
+        
         st.markdown("---")
         
+        refrescador = obtener_refrescador()
         if st.button("🔄 Actualizar datos"):
-            st.cache_data.clear()
-            st.rerun()
+            refrescador.solicitar()
+            st.toast("Actualización solicitada; los datos nuevos aparecerán al terminar")
+        
+        edad = int(time.time() - refrescador.estado.ultima_carga)
+        duracion = f"{refrescador.ultima_duracion:.1f} s" if refrescador.ultima_duracion is not None else "—"
+        st.caption(f"🕒 Datos de hace {edad // 60} min {edad % 60} s · último refresco: {duracion}")
+        if refrescador.ultimo_error:
+            st.caption(f"⚠️ Falló el último refresco, se muestran los datos anteriores: {refrescador.ultimo_error}")
+        for nombre, error in refrescador.estado.errores.items():
+            st.caption(f"⚠️ Fuente {nombre} sin actualizar: {error}")
+        for nombre, calidad in refrescador.estado.calidad_fechas().items():
+            ejemplos = '; '.join(f"{motivo}: {', '.join(repr(e) for e in valores)}"
+                                 for motivo, valores in calidad.ejemplos.items() if valores)
+            st.caption(
+                f"⚠️ {f'Fuente {nombre}: ' if len(refrescador.estado.estados) > 1 else ''}{calidad.resumen()}; "
+                "no aparecen en los gráficos",
+                help=f"Ejemplos — {ejemplos}" if ejemplos else None,
+            )
         
         st.markdown("---")
         
@@ -498,140 +465,257 @@ def main():
         """, unsafe_allow_html=True)
     
     # ========== FILTRAR POR MES ==========
-    df = df_completo.copy()
-    
-    if not ver_historico and 'fecha' in df.columns:
-        df = df[(df['fecha'].dt.year == año_sel) & (df['fecha'].dt.month == mes_sel)]
+    cubo = datos.cubo
+    if not ver_historico:
+        cubo = filtrar_cubo(cubo, año=año_sel, mes=mes_sel)
     
     # ========== HEADER ==========
-    errores_periodo = len(df) if df is not None else 0
+    errores_periodo = int(cubo['n'].sum())
     render_header(errores_periodo)
     
     # ========== SIN DATOS ==========
-    if df is None or len(df) == 0:
+    if errores_periodo == 0:
         st.warning("⚠️ No hay datos disponibles para el período seleccionado.")
         return
     
-    # ========== FILTRO SEVERIDAD ==========
-    if 'severidad' in df.columns and filtro_severidad:
-        df = df[df['severidad'].isin(filtro_severidad)]
-    
-    if len(df) == 0:
+    # ========== FILTROS DE SEVERIDAD, FUENTE Y DRILL-DOWN ==========
+    # El frame del período y sus índices de valores se construyen una vez por
+    # proceso y los comparten todas las sesiones (solo lectura); los filtros
+    # solo eligen posiciones sobre él
+    año_periodo, mes_periodo = (None, None) if ver_historico else (año_sel, mes_sel)
+    with perfilador.etapa("leer_periodo") as registro:
+        periodo = datos.periodo(año_periodo, mes_periodo, severidades=filtro_severidad, fuentes=filtro_fuente,
+                                filtros=drill)
+        registro['filas'] = periodo.filas
+    df = periodo.df
+    if drill:
+        # El cubo global no tiene la plantilla: con drill-down los gráficos
+        # salen del cubo de solo las filas que quedan
+        with perfilador.etapa("cubo_drill_down", filas=periodo.filas):
+            cubo = periodo.cubo
+    else:
+        if filtro_severidad:
+            cubo = filtrar_cubo(cubo, severidades=filtro_severidad)
+        if filtro_fuente:
+            cubo = filtrar_cubo(cubo, fuentes=filtro_fuente)
+    
+    if periodo.filas == 0:
         st.warning("⚠️ No hay datos con los filtros seleccionados.")
         return
     
-    # ========== ALERTA CRÍTICOS ==========
-    criticos = len(df[df['severidad'] == 'CRITICA']) if 'severidad' in df.columns else 0
-    if criticos > 0:
+    # ========== ALERTA DE PICOS ==========
+    # Picos de las últimas 24 h con datos según las líneas base del detector,
+    # sin importar el período seleccionado
+    recientes = datos.anomalias_recientes(fuentes=filtro_fuente)
+    if len(recientes) > 0:
+        detalle = ' · '.join(
+            (f"[{fila.fuente}] " if 'fuente' in recientes.columns else "")
+            + f"{fila.tipo_error}: {fila.n} a las {fila.hora:%d/%m %H:%M} (esperado ~{fila.esperado:g})"
+            + (" ⏳" if fila.en_curso else "")
+            for fila in recientes.sort_values('z', ascending=False).head(3).itertuples()
+        )
         st.markdown(f"""
         <div class="critical-banner">
-            ⚠️ ¡ALERTA! {criticos} errores críticos requieren atención
+            ⚠️ ¡ALERTA! {len(recientes)} pico(s) de errores sobre lo habitual<br>
+            <span style="font-weight: 400; font-size: 0.9rem;">{detalle}</span>
         </div>
         """, unsafe_allow_html=True)
     
+    if ver_historico:
+        anomalias = datos.anomalias_periodo(fuentes=filtro_fuente)
+    else:
+        anomalias = datos.anomalias_periodo(año_sel, mes_sel, fuentes=filtro_fuente)
+    if 'tipo_error' in drill and 'tipo_error' in anomalias.columns:
+        anomalias = anomalias[anomalias['tipo_error'].isin(drill['tipo_error'])]
+    
+    # Un mes cerrado se identifica por la huella de su contenido, que no cambia
+    # con cada refresco; sin filtros se sirve de su vista precalculada
+    huella_mes = None
+    vista = None
+    if not ver_historico and (año_sel, mes_sel) in datos.meses_cerrados():
+        huella_mes = datos.huella_mes(año_sel, mes_sel)
+        if not filtro_fuente and not drill and set(filtro_severidad) >= set(SEVERIDADES_VISTA):
+            with perfilador.etapa("cargar_vista"):
+                vista = obtener_vistas().obtener(año_sel, mes_sel, huella_mes)
+    
+    # Huella de los datos y filtros que determinan cada gráfico
+    filtros = (
+        huella_mes or datos.version,
+        None if ver_historico else (año_sel, mes_sel),
+        tuple(sorted(filtro_severidad)),
+        tuple(sorted(filtro_fuente)),
+        tuple(sorted((dimension, tuple(valores)) for dimension, valores in drill.items())),
+    )
+    
     # ========== KPIs ==========
-    render_kpis(df)
+    with perfilador.etapa("render_kpis", filas=len(cubo)):
+        render_kpis(cubo, vista['kpis'] if vista else None)
     
     st.markdown("<br>", unsafe_allow_html=True)
     
     # ========== INFO PERÍODO ==========
-    if 'fecha' in df.columns:
-        df_fechas = df.dropna(subset=['fecha'])
-        if len(df_fechas) > 0:
-            fecha_min = df_fechas['fecha'].min()
-            fecha_max = df_fechas['fecha'].max()
-            periodo_texto = f"{MESES_ES.get(mes_sel, mes_sel)} {año_sel}" if not ver_historico else "Histórico completo"
-            st.markdown(f"""
-            <div class="info-box">
-                📅 <strong>Período:</strong> {periodo_texto} | 
-                <strong>Desde:</strong> {fecha_min.strftime('%d/%m/%Y')} <strong>hasta:</strong> {fecha_max.strftime('%d/%m/%Y')} | 
-                📊 <strong>Total:</strong> {len(df):,} registros
-            </div>
-            """, unsafe_allow_html=True)
+    fecha_min, fecha_max = vista['rango'] if vista else rango_fechas_cubo(cubo)
+    if fecha_min is not None:
+        periodo_texto = f"{MESES_ES.get(mes_sel, mes_sel)} {año_sel}" if not ver_historico else "Histórico completo"
+        st.markdown(f"""
+        <div class="info-box">
+            📅 <strong>Período:</strong> {periodo_texto} | 
+            <strong>Desde:</strong> {fecha_min.strftime('%d/%m/%Y')} <strong>hasta:</strong> {fecha_max.strftime('%d/%m/%Y')} | 
+            📊 <strong>Total:</strong> {int(cubo['n'].sum()):,} registros
+        </div>
+        """, unsafe_allow_html=True)
     
     # ========== GRÁFICOS FILA 1 ==========
     col1, col2 = st.columns(2)
     
     with col1:
-        fig = grafico_tendencia_diaria(df)
-        if fig: 
-            st.plotly_chart(fig, use_container_width=True)
+        desde = hasta = None
+        anomalias_rango = anomalias
+        if ver_historico and fecha_min is not None:
+            # Hasta DIAS_POR_HORA días la serie va por hora; más, por día
+            rango = st.date_input(
+                "Rango de la serie:",
+                value=(fecha_min.date(), fecha_max.date()),
+                min_value=fecha_min.date(),
+                max_value=fecha_max.date(),
+                format="DD/MM/YYYY",
+            )
+            # Mientras se elige el segundo extremo llega un solo día
+            inicio, fin = (rango[0], rango[-1]) if rango else (fecha_min.date(), fecha_max.date())
+            desde = datetime.combine(inicio, datetime.min.time())
+            hasta = datetime.combine(fin, datetime.min.time()) + timedelta(hours=23)
+            anomalias_rango = anomalias[(anomalias['hora'] >= desde) & (anomalias['hora'] <= hasta)]
+        
+        if ver_historico and drill:
+            mostrar_grafico(
+                lambda: grafico_serie_temporal(*serie_temporal(serie_horaria(cubo), filtro_severidad, desde, hasta),
+                                               anomalias_rango),
+                perfilador, "grafico_serie_temporal", filtros + (desde, hasta),
+            )
+        elif ver_historico:
+            mostrar_grafico(
+                lambda: grafico_serie_temporal(*datos.serie_temporal(filtro_severidad, desde, hasta, fuentes=filtro_fuente),
+                                               anomalias_rango),
+                perfilador, "grafico_serie_temporal", filtros + (desde, hasta),
+            )
+        else:
+            mostrar_grafico(lambda: grafico_tendencia_diaria(cubo, anomalias), perfilador, "grafico_tendencia_diaria", filtros, vista)
     
     with col2:
-        fig = grafico_severidad(df)
-        if fig: 
-            st.plotly_chart(fig, use_container_width=True)
+        mostrar_grafico(lambda: grafico_severidad(cubo), perfilador, "grafico_severidad", filtros, vista)
     
     # ========== GRÁFICOS FILA 2 ==========
     col1, col2 = st.columns(2)
     
     with col1:
-        fig = grafico_por_tipo(df)
-        if fig: 
-            st.plotly_chart(fig, use_container_width=True)
+        mostrar_grafico(lambda: grafico_por_tipo(cubo), perfilador, "grafico_por_tipo", filtros, vista)
     
     with col2:
-        fig = grafico_mensajes_error(df)
-        if fig: 
-            st.plotly_chart(fig, use_container_width=True)
+        mostrar_grafico(
+            lambda: grafico_mensajes_error(
+                *datos.mas_frecuentes(10, año_periodo, mes_periodo, filtro_severidad, filtro_fuente, drill)),
+            perfilador, "grafico_mensajes_error", filtros, vista,
+        )
     
     # ========== POR HORA ==========
-    fig = grafico_por_hora(df)
-    if fig: 
-        st.plotly_chart(fig, use_container_width=True)
+    mostrar_grafico(lambda: grafico_por_hora(cubo, anomalias), perfilador, "grafico_por_hora", filtros, vista)
     
     # ========== TABS ==========
     tab1, tab2, tab3 = st.tabs(["📋 Detalle Mensajes", "🔍 Explorar Datos", "📊 Resumen"])
     
     with tab1:
-        if 'error_message' in df.columns:
-            msgs = df['error_message'].dropna()
-            msgs = msgs[msgs != '']
-            if len(msgs) > 0:
-                top = msgs.value_counts().head(20).reset_index()
-                top.columns = ['Mensaje de Error', 'Repeticiones']
-                st.dataframe(top, use_container_width=True, hide_index=True)
+        if 'plantilla' in df.columns:
+            if vista:
+                top, error = vista['top']
+            else:
+                top, error = datos.mas_frecuentes(20, año_periodo, mes_periodo, filtro_severidad, filtro_fuente, drill)
+            top = top.reset_index()
+            if len(top) > 0:
+                top.columns = ['Mensaje de Error (plantilla)', 'Repeticiones']
+                with perfilador.etapa("tabla_mensajes (envío)") as registro:
+                    st.dataframe(top, use_container_width=True, hide_index=True)
+                registro['bytes'] = tamaño_payload(top) if perfilador.activo else None
+                if error:
+                    st.caption(f"Conteos aproximados (resúmenes por mes): cada uno puede quedarse corto hasta en {error:,}")
             else:
                 st.info("No hay mensajes de error registrados")
         else:
             st.info("La columna 'error_message' no existe")
     
     with tab2:
-        if 'tipo_error' in df.columns:
-            tipos = ["Todos"] + list(df['tipo_error'].dropna().unique())
-            tipo_sel = st.selectbox("Filtrar por tipo:", tipos)
-            df_show = df if tipo_sel == "Todos" else df[df['tipo_error'] == tipo_sel]
-            st.dataframe(df_show, use_container_width=True, height=400)
-        else:
-            st.dataframe(df, use_container_width=True, height=400)
+        col1, col2, col3 = st.columns([2, 3, 2])
+        tipo_sel = "Todos"
+        with col1:
+            if 'tipo_error' in cubo.columns:
+                tipos = ["Todos"] + list(total_por(cubo, 'tipo_error').index)
+                tipo_sel = st.selectbox("Filtrar por tipo:", tipos)
+        with col2:
+            columnas = st.multiselect("Columnas:", list(df.columns), default=list(df.columns)) or list(df.columns)
+        with col3:
+            orden = st.selectbox("Ordenar por:", ["(orden original)"] + columnas)
+            ascendente = st.toggle("Ascendente", value=True)
+        
+        consulta = st.text_input(
+            "Buscar en mensajes:",
+            placeholder="todas las palabras; termina con * para buscar por prefijo (ej. timeout orden 99*)",
+        ).strip()
+        posiciones = filas_explorador(periodo, tipo=None if tipo_sel == "Todos" else tipo_sel, consulta=consulta)
+        if consulta and periodo.buscar(consulta) is not None and 'fecha' in df.columns:
+            mostrar_grafico(
+                lambda: grafico_coincidencias(conteo_diario(df, posiciones), consulta),
+                perfilador, "grafico_coincidencias", filtros + (tipo_sel, consulta),
+            )
+        
+        col1, col2, _ = st.columns([1, 1, 3])
+        with col1:
+            tam = st.selectbox("Filas por página:", [25, 50, 100, 250], index=1)
+        paginas = max((len(posiciones) - 1) // tam + 1, 1)
+        with col2:
+            pagina = st.number_input("Página:", min_value=1, max_value=paginas, value=1) - 1
+        
+        visibles = pagina_tabla(
+            df, posiciones, columnas,
+            orden=None if orden == "(orden original)" else orden,
+            ascendente=ascendente, pagina=pagina, tam=tam,
+        )
+        with perfilador.etapa("tabla_explorador (envío)", filas=len(visibles)) as registro:
+            st.dataframe(visibles, use_container_width=True, height=400)
+        registro['bytes'] = tamaño_payload(visibles) if perfilador.activo else None
+        st.caption(f"Página {pagina + 1} de {paginas} · {len(posiciones):,} filas")
     
     with tab3:
+        metricas = vista['metricas'] if vista else metricas_resumen(cubo)
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Errores", f"{len(df):,}")
+            st.metric("Total Errores", f"{metricas['total']:,}")
         with col2:
-            if 'tipo_error' in df.columns:
-                st.metric("Tipos Únicos", df['tipo_error'].nunique())
+            if metricas['tipos_unicos'] is not None:
+                st.metric("Tipos Únicos", metricas['tipos_unicos'])
         with col3:
-            if 'fecha' in df.columns:
-                dias = df.dropna(subset=['fecha'])['fecha'].dt.day.nunique()
-                st.metric("Días con Errores", dias)
+            if metricas['dias_con_errores'] is not None:
+                st.metric("Días con Errores", metricas['dias_con_errores'])
         with col4:
-            if 'fecha' in df.columns:
-                dias = max(df.dropna(subset=['fecha'])['fecha'].dt.day.nunique(), 1)
-                st.metric("Promedio/día", f"{len(df)//dias:,}")
+            if metricas['promedio_dia'] is not None:
+                st.metric("Promedio/día", f"{metricas['promedio_dia']:,}")
+        
+        with st.expander("🧠 Uso de memoria"):
+            if st.button("Calcular reporte de memoria"):
+                st.dataframe(reporte_memoria(df), use_container_width=True, hide_index=True)
     
     # ========== DESCARGAR ==========
     st.markdown("<br>", unsafe_allow_html=True)
     col1, col2, col3 = st.columns([1,1,1])
     with col2:
-        csv = df.to_csv(index=False).encode('utf-8')
+        formato = st.selectbox("Formato de descarga:", list(FORMATOS_EXPORTACION))
+        extension, mime = FORMATOS_EXPORTACION[formato]
         nombre_mes = MESES_ES.get(mes_sel, str(mes_sel))
+        clave = (datos.version,) + filtros[1:] + (tipo_sel, consulta, formato)
+        cache = obtener_cache_exportaciones()
         st.download_button(
-            "📥 Descargar CSV",
-            csv,
-            f"errores_proa_{nombre_mes}_{año_sel}.csv",
-            "text/csv",
+            f"📥 Descargar {formato}",
+            lambda: cache.abrir(clave, df, posiciones, formato),
+            f"errores_proa_{nombre_mes}_{año_sel}{extension}",
+            mime,
             use_container_width=True
         )
 
@@ -0,0 +1,549 @@
+# -*- coding: utf-8 -*-
+"""
+🏥 DASHBOARD DE ERRORES API - BENCHMARK
+=======================================
+Genera logs de errores sintéticos (sin red) y mide cada etapa del camino
+de datos del dashboard: parseo, meses disponibles, filtro por mes, KPIs,
+cada gráfico y la exportación CSV. Guarda tiempos y pico de memoria en
+JSON para comparar versiones. Con `--sesiones` además simula varias
+sesiones simultáneas y reporta latencia de rerun y memoria. `--comprobar`
+corre solo las comprobaciones de casos que ya fallaron alguna vez.
+
+    python benchmark.py --filas 100000 1000000
+    python benchmark.py --filas 100000 --comparar bench_anterior.json
+    python benchmark.py --filas 1000000 --sesiones 1 10 30 --reruns 10
+    python benchmark.py --comprobar
+
+Autor: Lizbeth Ramírez | PROA - Ecommerce
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import graficos
+import nucleo
+import precalculo
+
+# ============================================
+# DATOS SINTÉTICOS
+# ============================================
+TIPOS_ERROR = [
+    'TIMEOUT', 'HTTP_500', 'HTTP_502', 'HTTP_503', 'HTTP_404', 'HTTP_400',
+    'AUTH', 'TOKEN_EXPIRADO', 'VALIDACION', 'DB', 'DB_DEADLOCK', 'RATE_LIMIT',
+    'SSL', 'DNS', 'PAGO_RECHAZADO', 'INVENTARIO', 'CARRITO', 'CUPON',
+    'ENVIO', 'NOTIFICACION', 'PDF_RESULTADOS', 'AGENDA', 'SUCURSAL', 'LAB', 'OTRO',
+]
+SEVERIDADES = ['CRITICA', 'ALTA', 'MEDIA', 'BAJA']
+PROB_SEVERIDAD = [0.05, 0.20, 0.40, 0.35]
+
+# (prefijo, sufijo); entre ambos va una parte variable, salvo que el sufijo sea None
+PLANTILLAS = [
+    ("Timeout al consultar orden ", " en /api/ordenes"),
+    ("Paciente ", " no encontrado"),
+    ("Error 500 request id ", ""),
+    ("Token expirado", None),
+    ("Pago rechazado para orden ", " por el banco"),
+    ("Deadlock en transacción ", ""),
+    ("Cupón ", " inválido o vencido"),
+    ("No hay inventario del estudio ", ""),
+    ("Rate limit excedido", None),
+    ("Sucursal ", " sin horarios disponibles"),
+] + [(f"Error de validación en campo campo_{k}: valor ", "") for k in range(40)]
+
+def _zipf(n, k, rng, s=1.2):
+    """Índices en [0, k) con distribución sesgada tipo Zipf"""
+    pesos = 1.0 / np.arange(1, k + 1) ** s
+    return rng.choice(k, size=n, p=pesos / pesos.sum())
+
+# Los logs generados cubren siempre este lapso, sin importar el tamaño
+INICIO_LOG = pd.Timestamp('2024-01-01')
+MINUTOS_LOG = 18 * 30 * 24 * 60
+
+def generar_bloque(n, desde_min, hasta_min, rng):
+    """DataFrame sintético de `n` filas con fechas entre los minutos dados"""
+    minutos = np.sort(rng.uniform(desde_min, hasta_min, size=n))
+    fechas = INICIO_LOG + pd.to_timedelta(minutos, unit='m')
+    
+    idx = _zipf(n, len(PLANTILLAS), rng)
+    prefijos = np.array([p for p, _ in PLANTILLAS], dtype=object)[idx]
+    sufijos = np.array([s for _, s in PLANTILLAS], dtype=object)[idx]
+    sin_variable = pd.isna(sufijos)
+    variables = np.where(sin_variable, '', rng.integers(1000, 10_000_000, size=n).astype(str)).astype(object)
+    mensajes = prefijos + variables + np.where(sin_variable, '', sufijos).astype(object)
+    
+    return pd.DataFrame({
+        'fecha': fechas.strftime('%Y-%m-%d %H:%M:%S'),
+        'api': 'proa',
+        'severidad': np.array(SEVERIDADES)[rng.choice(4, size=n, p=PROB_SEVERIDAD)],
+        'tipo_error': np.array(TIPOS_ERROR)[_zipf(n, len(TIPOS_ERROR), rng)],
+        'error_message': mensajes,
+        'endpoint': '/api/v1/recurso',
+    })
+
+def generar_log(filas, ruta, semilla=42, filas_por_bloque=1_000_000):
+    """Escribe un CSV sintético de `filas` filas en `ruta`, por bloques"""
+    rng = np.random.default_rng(semilla)
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        for i in range(0, filas, filas_por_bloque):
+            n = min(filas_por_bloque, filas - i)
+            bloque = generar_bloque(n, MINUTOS_LOG * i / filas, MINUTOS_LOG * (i + n) / filas, rng)
+            bloque.to_csv(f, index=False, header=(i == 0))
+    return ruta
+
+# ============================================
+# MEDICIÓN
+# ============================================
+def medir(funcion, repeticiones):
+    """Tiempos de `repeticiones` ejecuciones más el pico de memoria de una adicional"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return resultado, {
+        'segundos_min': min(tiempos),
+        'segundos_mediana': statistics.median(tiempos),
+        'pico_mb': round(pico / 1e6, 2),
+    }
+
+def etapas_dashboard(ruta, directorio, repeticiones):
+    """Mide cada etapa del camino de datos sobre el CSV en `ruta`"""
+    resultados = {}
+    
+    def cargar():
+        estado = nucleo.EstadoIngesta(nucleo.FuenteArchivo(ruta))
+        estado.actualizar()
+        return estado
+    
+    estado, resultados['carga_completa'] = medir(cargar, repeticiones)
+    datos = estado.instantanea
+    
+    # Cola de 1% de filas nuevas sobre lo ya ingerido
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    corte = contenido.index(b'\n', int(len(contenido) * 0.99)) + 1
+    ruta_parcial = os.path.join(directorio, 'parcial.csv')
+    
+    def incremental():
+        with open(ruta_parcial, 'wb') as f:
+            f.write(contenido[:corte])
+        parcial = nucleo.EstadoIngesta(nucleo.FuenteArchivo(ruta_parcial))
+        parcial.actualizar()
+        with open(ruta_parcial, 'wb') as f:
+            f.write(contenido)
+        inicio = time.perf_counter()
+        parcial.actualizar()
+        return time.perf_counter() - inicio
+    
+    tiempos = [incremental() for _ in range(repeticiones)]
+    resultados['carga_incremental_1pct'] = {
+        'segundos_min': min(tiempos),
+        'segundos_mediana': statistics.median(tiempos),
+        'pico_mb': None,
+    }
+    contenido = None
+    
+    # Fechas en formato local (dd/mm/aaaa): el primer parseo va por strptime,
+    # los siguientes salen de la caché de textos ya vistos
+    fechas = pd.read_csv(ruta, usecols=['fecha'], dtype=str)['fecha']
+    locales = pd.to_datetime(fechas).dt.strftime('%d/%m/%Y %H:%M:%S')
+    _, resultados['parseo_fechas_iso'] = medir(lambda: nucleo.parsear_fechas(fechas), repeticiones)
+    nucleo._fechas_vistas.clear()
+    _, resultados['parseo_fechas_local'] = medir(lambda: nucleo.parsear_fechas(locales), repeticiones)
+    fechas = locales = None
+    
+    meses, resultados['obtener_meses_disponibles'] = medir(
+        lambda: nucleo.obtener_meses_disponibles(datos), repeticiones)
+    año, mes = meses[0]['año'], meses[0]['mes']
+    
+    def filtro_mes():
+        datos._periodos.clear()  # medir la lectura de las particiones, no la caché de períodos
+        return datos.periodo(año, mes).df, nucleo.filtrar_cubo(datos.cubo, año=año, mes=mes)
+    
+    (df_mes, cubo_mes), resultados['filtro_mes'] = medir(filtro_mes, repeticiones)
+    _, resultados['kpis'] = medir(lambda: nucleo.kpis(cubo_mes), repeticiones)
+    
+    for nombre in ['grafico_tendencia_diaria', 'grafico_severidad', 'grafico_por_tipo', 'grafico_por_hora']:
+        funcion = getattr(graficos, nombre)
+        _, resultados[nombre] = medir(lambda: funcion(cubo_mes), repeticiones)
+    _, resultados['grafico_mensajes_error'] = medir(
+        lambda: graficos.grafico_mensajes_error(nucleo.contar_top(df_mes['plantilla'], 10)), repeticiones)
+    
+    _, resultados['top_mensajes_historico_exacto'] = medir(
+        lambda: nucleo.contar_top(datos.periodo().df['plantilla'], 20), repeticiones)
+    _, resultados['top_mensajes_historico_resumen'] = medir(
+        lambda: nucleo.ResumenFrecuentes.combinar(
+            resumen for parte in datos._partes() for resumen in parte.resumenes.values()).top(20),
+        repeticiones)
+    
+    # Pasar a un mes cerrado: todo en vivo frente a su vista precalculada
+    if datos.meses_cerrados():
+        año_cerrado, mes_cerrado = datos.meses_cerrados()[0]
+        dir_vistas = os.path.join(directorio, 'vistas.d')
+        shutil.rmtree(dir_vistas, ignore_errors=True)
+        inicio = time.perf_counter()
+        precalculo.precalcular(datos, dir_vistas)
+        segundos = time.perf_counter() - inicio
+        resultados['precalcular_meses_cerrados'] = {'segundos_min': segundos, 'segundos_mediana': segundos, 'pico_mb': None}
+        _, resultados['mes_cerrado_en_vivo'] = medir(
+            lambda: precalculo.construir_vista(datos, año_cerrado, mes_cerrado), repeticiones)
+        huella = datos.huella_mes(año_cerrado, mes_cerrado)
+        _, resultados['mes_cerrado_vista'] = medir(
+            lambda: precalculo.VistasMes(dir_vistas).obtener(año_cerrado, mes_cerrado, huella), repeticiones)
+    
+    # Drill-down sobre el histórico: índices de valores frente a máscaras sobre todo el frame
+    periodo = datos.periodo()
+    historico = periodo.df
+    drill = {
+        'tipo_error': [historico['tipo_error'].mode()[0]],
+        'hora': [9, 10],
+        'plantilla': [historico['plantilla'].mode()[0]],
+    }
+    _, resultados['drill_down_indices'] = medir(lambda: periodo.filtrar(drill).posiciones, repeticiones)
+    _, resultados['drill_down_mascaras'] = medir(
+        lambda: np.flatnonzero((
+            historico['tipo_error'].isin(drill['tipo_error'])
+            & historico['fecha'].dt.hour.isin(drill['hora'])
+            & historico['plantilla'].isin(drill['plantilla'])
+        ).to_numpy()),
+        repeticiones)
+    
+    posiciones = np.arange(len(historico))
+    ruta_csv = os.path.join(directorio, 'export.csv')
+    _, resultados['exportar_csv_historico'] = medir(
+        lambda: nucleo.exportar(historico, posiciones, 'CSV', ruta_csv), repeticiones)
+    
+    return resultados
+
+# ============================================
+# CARGA CON VARIAS SESIONES
+# ============================================
+def rss_mb():
+    """Memoria residente actual del proceso"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def rerun_dashboard(datos, figuras, rng):
+    """Lo que hace un rerun del dashboard con filtros al azar, sin Streamlit.
+
+    Mismas llamadas que `app.py` (período compartido, cubo, gráficos por la
+    caché de figuras compartida y página del explorador); el JSON de cada
+    figura es lo que Streamlit serializa por sesión en cada rerun.
+    """
+    meses = datos.meses()
+    historico = rng.random() < 0.2
+    año, mes = (None, None) if historico else meses[rng.integers(len(meses))]
+    severidades = sorted(str(s) for s in rng.choice(SEVERIDADES, size=rng.integers(1, 5), replace=False))
+    
+    drill = {'hora': sorted(int(h) for h in rng.choice(24, size=2, replace=False))} if rng.random() < 0.3 else {}
+    
+    cubo = datos.cubo if historico else nucleo.filtrar_cubo(datos.cubo, año=año, mes=mes)
+    cubo = nucleo.filtrar_cubo(cubo, severidades=severidades)
+    periodo = datos.periodo(año, mes, severidades=severidades, filtros=drill)
+    if drill:
+        cubo = periodo.cubo
+    nucleo.kpis(cubo)
+    anomalias = datos.anomalias_periodo(año, mes)
+    
+    filtros = (datos.version, None if historico else (año, mes), tuple(severidades), (),
+               tuple((dimension, tuple(valores)) for dimension, valores in drill.items()))
+    construir = {
+        'grafico_severidad': lambda: graficos.grafico_severidad(cubo),
+        'grafico_por_tipo': lambda: graficos.grafico_por_tipo(cubo),
+        'grafico_por_hora': lambda: graficos.grafico_por_hora(cubo, anomalias),
+        'grafico_mensajes_error': lambda: graficos.grafico_mensajes_error(
+            *datos.mas_frecuentes(10, año, mes, severidades, filtros=drill)),
+    }
+    if historico and drill:
+        construir['grafico_serie_temporal'] = lambda: graficos.grafico_serie_temporal(
+            *nucleo.serie_temporal(nucleo.serie_horaria(cubo), severidades), anomalias)
+    elif historico:
+        construir['grafico_serie_temporal'] = lambda: graficos.grafico_serie_temporal(
+            *datos.serie_temporal(severidades), anomalias)
+    else:
+        construir['grafico_tendencia_diaria'] = lambda: graficos.grafico_tendencia_diaria(cubo, anomalias)
+    enviados = [figuras.obtener((nombre,) + filtros, f).to_json() for nombre, f in construir.items()]
+    
+    tipos = list(nucleo.total_por(cubo, 'tipo_error').index)
+    tipo = tipos[rng.integers(len(tipos))] if tipos and rng.random() < 0.5 else None
+    posiciones = nucleo.filas_explorador(periodo, tipo=tipo)
+    paginas = max((len(posiciones) - 1) // 50 + 1, 1)
+    tabla = nucleo.pagina_tabla(periodo.df, posiciones, list(periodo.df.columns), pagina=int(rng.integers(paginas)))
+    return enviados, tabla
+
+def sesion_dashboard(datos, figuras, reruns, rng, latencias):
+    """Una sesión que cambia filtros al azar en cada rerun; devuelve lo último enviado"""
+    ultimo = None
+    for _ in range(reruns):
+        inicio = time.perf_counter()
+        ultimo = rerun_dashboard(datos, figuras, rng)
+        latencias.append(time.perf_counter() - inicio)
+    return ultimo
+
+def carga_sesiones(ruta, sesiones, reruns, semilla):
+    """Latencia de rerun y memoria con `sesiones` sesiones simultáneas sobre el CSV en `ruta`.
+
+    Las sesiones son hilos de un mismo proceso, como en el servidor de
+    Streamlit: comparten la instantánea y la caché de figuras, y cada una
+    conserva lo último que envió.
+    """
+    estado = nucleo.EstadoIngesta(nucleo.FuenteArchivo(ruta))
+    estado.actualizar()
+    datos = estado.instantanea
+    figuras = graficos.CacheFiguras()
+    
+    rss_inicial = rss_mb()
+    pico = [rss_inicial]
+    terminado = threading.Event()
+    
+    def muestrear():
+        while not terminado.wait(0.05):
+            pico[0] = max(pico[0], rss_mb())
+    
+    muestreo = threading.Thread(target=muestrear, daemon=True)
+    muestreo.start()
+    latencias = []
+    with concurrent.futures.ThreadPoolExecutor(sesiones) as pool:
+        futuros = [
+            pool.submit(sesion_dashboard, datos, figuras, reruns, np.random.default_rng(semilla + k), latencias)
+            for k in range(sesiones)
+        ]
+        vivas = [f.result() for f in futuros]  # se mantienen vivas para medir su memoria
+    rss_final = rss_mb()
+    terminado.set()
+    muestreo.join()
+    
+    return {
+        'sesiones': sesiones,
+        'reruns': len(latencias),
+        'rerun_ms_p50': round(float(np.percentile(latencias, 50)) * 1000, 1),
+        'rerun_ms_p95': round(float(np.percentile(latencias, 95)) * 1000, 1),
+        'rss_inicial_mb': round(rss_inicial, 1),
+        'rss_pico_mb': round(max(pico[0], rss_final), 1),
+        'mb_por_sesion': round((rss_final - rss_inicial) / len(vivas), 2),
+    }
+
+# ============================================
+# COMPROBACIONES
+# ============================================
+def ingerir(directorio, nombre, df):
+    """Instantánea de un CSV con las filas de `df`"""
+    ruta = os.path.join(directorio, nombre)
+    df.to_csv(ruta, index=False)
+    estado = nucleo.EstadoIngesta(nucleo.FuenteArchivo(ruta))
+    estado.actualizar()
+    return estado
+
+def log_horario(dias, por_hora=3, desde=INICIO_LOG):
+    """Log con `por_hora` errores TIMEOUT en cada hora de `dias` días"""
+    fechas = np.repeat(pd.date_range(desde, periods=dias * 24, freq='h'), por_hora)
+    return pd.DataFrame({
+        'fecha': fechas.strftime('%Y-%m-%d %H:%M:%S'),
+        'severidad': 'ALTA',
+        'tipo_error': 'TIMEOUT',
+        'error_message': 'Timeout al consultar orden 1',
+    })
+
+def comprobar_alerta_vieja(directorio):
+    """Un pico de hace 40 días no es una alerta vigente"""
+    df = log_horario(60)
+    pico = df.head(1).loc[[0] * 100].assign(fecha='2024-01-20 10:30:00')
+    datos = ingerir(directorio, 'alerta_vieja.csv', pd.concat([df, pico])).instantanea
+    assert len(datos.anomalias) > 0, "no se detectó el pico"
+    assert len(datos.anomalias_recientes()) == 0, "un pico viejo aparece como alerta"
+
+def comprobar_fecha_vacia(directorio):
+    """Una celda `fecha` vacía cuenta como fallida sin tumbar la ingesta"""
+    df = log_horario(1)
+    df.loc[5, 'fecha'] = None
+    estado = ingerir(directorio, 'fecha_vacia.csv', df)
+    assert estado.instantanea.filas == len(df), "se perdieron filas"
+    assert estado.calidad_fechas.fallidas['vacía'] == 1, "la fecha vacía no se contó"
+
+def comprobar_fecha_futura(directorio):
+    """Una fila con fecha futura mal capturada no frena la detección de lo que llega después"""
+    df = log_horario(60)
+    errata = df.head(1).assign(fecha='2035-01-15 08:00:00')
+    pico = df.head(1).loc[[0] * 100].assign(fecha='2024-02-20 10:30:00')
+    estado = ingerir(directorio, 'fecha_futura.csv', pd.concat([df.iloc[:40 * 24 * 3], errata]))
+    pd.concat([df.iloc[40 * 24 * 3:], pico]).to_csv(estado.fuente.ruta, mode='a', header=False, index=False)
+    estado.actualizar()
+    anomalias = estado.instantanea.anomalias
+    assert (anomalias['hora'] == pd.Timestamp('2024-02-20 10:00')).any(), "no se detectó el pico posterior"
+    assert estado.instantanea.ultima_hora() == pd.Timestamp('2024-02-29 23:00'), "la fecha futura cuenta como reciente"
+
+def comprobar_severidad_vacia(directorio):
+    """Con todas las severidades elegidas, las filas sin severidad quedan fuera como en el cubo"""
+    df = log_horario(1)
+    df.loc[[3, 7], 'severidad'] = None
+    datos = ingerir(directorio, 'severidad_vacia.csv', df).instantanea
+    severidades = ['CRITICA', 'ALTA', 'MEDIA', 'BAJA']
+    filas = datos.periodo(severidades=severidades).filas
+    assert filas == int(nucleo.filtrar_cubo(datos.cubo, severidades=severidades)['n'].sum()) == len(df) - 2, \
+        "el período y el cubo no coinciden"
+
+def comprobar_fuentes_url(directorio):
+    """Una URL sin nombre no se parte en el '=' de su query string"""
+    url = 'https://docs.google.com/spreadsheets/d/x/export?format=csv&gid=0'
+    fuentes = nucleo.crear_fuentes(f"{url};proa=https://host/export?format=csv|5")
+    assert list(fuentes) == ['fuente_1', 'proa'], f"nombres: {list(fuentes)}"
+    assert fuentes['fuente_1'].url == url and fuentes['proa'].url == 'https://host/export?format=csv', "URL recortada"
+
+def comprobar_fuentes_http(directorio):
+    """Una fuente lenta y una caída no frenan a la sana, que responde 304 sin cambios y agrega lo nuevo"""
+    ruta = os.path.join(directorio, 'fuentes_http.csv')
+    log_horario(2).to_csv(ruta, index=False)
+    sana, url_sana = nucleo.servidor_csv_local(ruta)
+    lenta, url_lenta = nucleo.servidor_csv_local(ruta, retraso=5)
+    caida, url_caida = nucleo.servidor_csv_local(os.path.join(directorio, 'no_existe.csv'))
+    try:
+        ingesta = nucleo.IngestaMultiple(nucleo.crear_fuentes(f"sana={url_sana};lenta={url_lenta}|1;caida={url_caida}"))
+        inicio = time.perf_counter()
+        ingesta.actualizar()
+        assert time.perf_counter() - inicio < 5, "la fuente lenta frenó el refresco"
+        assert ingesta.instantanea.fuentes() == ['sana'], f"publicadas: {ingesta.instantanea.fuentes()}"
+        assert set(ingesta.errores) == {'lenta', 'caida'}, f"errores: {ingesta.errores}"
+        
+        # Sin cambios el servidor responde 304 y la instantánea no se rehace
+        estado = ingesta.estados['sana']
+        version = estado.instantanea.version
+        estado.actualizar()
+        assert estado.instantanea.version == version, "se rehizo sin cambios"
+        log_horario(1, desde=INICIO_LOG + pd.Timedelta(days=2)).to_csv(ruta, mode='a', header=False, index=False)
+        estado.actualizar()
+        assert estado.instantanea.filas == 3 * 24 * 3, "no se agregó la cola nueva"
+    finally:
+        for servidor in (sana, lenta, caida):
+            servidor.shutdown()
+            servidor.server_close()
+
+def comprobar_vista_severidad(directorio):
+    """La vista precalculada de un mes cerrado coincide con la vista en vivo por defecto"""
+    df = log_horario(40)
+    df.loc[[3, 7], 'severidad'] = None
+    datos = ingerir(directorio, 'vista_severidad.csv', df).instantanea
+    año, mes = datos.meses_cerrados()[0]
+    vista = precalculo.construir_vista(datos, año, mes)
+    severidades = precalculo.SEVERIDADES_VISTA
+    cubo = nucleo.filtrar_cubo(datos.cubo, año=año, mes=mes, severidades=severidades)
+    assert vista['kpis'] == nucleo.kpis(cubo), "los KPIs no coinciden"
+    assert vista['metricas'] == nucleo.metricas_resumen(cubo), "las métricas no coinciden"
+    top, _ = datos.mas_frecuentes(20, año, mes, severidades)
+    assert vista['top'][0].equals(top), "el top no coincide"
+
+COMPROBACIONES = [
+    comprobar_alerta_vieja,
+    comprobar_fecha_vacia,
+    comprobar_fecha_futura,
+    comprobar_severidad_vacia,
+    comprobar_fuentes_url,
+    comprobar_fuentes_http,
+    comprobar_vista_severidad,
+]
+
+def comprobar():
+    """Corre `COMPROBACIONES`; devuelve cuántas fallaron"""
+    fallidas = 0
+    with tempfile.TemporaryDirectory(prefix='proa_comprobar_') as directorio:
+        for comprobacion in COMPROBACIONES:
+            try:
+                comprobacion(directorio)
+            except AssertionError as e:
+                fallidas += 1
+                print(f"✗ {comprobacion.__name__}: {e}")
+            else:
+                print(f"✓ {comprobacion.__name__}")
+    return fallidas
+
+def comparar(actual, anterior):
+    """Imprime la razón de tiempos contra un resultado anterior"""
+    previos = {(r['filas'], r['etapa']): r for r in anterior['resultados']}
+    for r in actual['resultados']:
+        previo = previos.get((r['filas'], r['etapa']))
+        if previo and previo['segundos_min']:
+            razon = r['segundos_min'] / previo['segundos_min']
+            marca = '  ⚠️ regresión' if razon > 1.2 else ''
+            print(f"{r['filas']:>12,} {r['etapa']:<28} {razon:6.2f}x{marca}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del camino de datos del dashboard")
+    parser.add_argument('--filas', type=int, nargs='+', default=[100_000, 1_000_000],
+                        help="tamaños del log sintético (hasta 50M)")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--directorio', help="dónde dejar los CSV generados (por defecto temporal)")
+    parser.add_argument('-o', '--salida', default='bench_resultados.json')
+    parser.add_argument('--comparar', help="JSON de una corrida anterior")
+    parser.add_argument('--sesiones', type=int, nargs='+', default=[],
+                        help="además, prueba de carga con estas cantidades de sesiones simultáneas")
+    parser.add_argument('--reruns', type=int, default=10, help="reruns por sesión en la prueba de carga")
+    parser.add_argument('--comprobar', action='store_true', help="solo correr las comprobaciones")
+    args = parser.parse_args(argv)
+    if args.comprobar:
+        return 1 if comprobar() else 0
+    
+    directorio = args.directorio or tempfile.mkdtemp(prefix='proa_bench_')
+    salida = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'resultados': [],
+        'carga': [],
+    }
+    
+    for filas in args.filas:
+        ruta = os.path.join(directorio, f'errores_{filas}.csv')
+        if not os.path.exists(ruta):
+            print(f"Generando {filas:,} filas en {ruta}...", file=sys.stderr)
+            generar_log(filas, ruta, args.semilla)
+        
+        for etapa, medicion in etapas_dashboard(ruta, directorio, args.repeticiones).items():
+            salida['resultados'].append({'filas': filas, 'etapa': etapa, **medicion})
+            pico = f"{medicion['pico_mb']:>10.1f} MB" if medicion['pico_mb'] is not None else ' ' * 13
+            print(f"{filas:>12,} {etapa:<28} {medicion['segundos_min'] * 1000:>10.1f} ms {pico}")
+        
+        for sesiones in sorted(args.sesiones):
+            carga = carga_sesiones(ruta, sesiones, args.reruns, args.semilla)
+            salida['carga'].append({'filas': filas, **carga})
+            print(f"{filas:>12,} {sesiones:>4} sesiones  rerun p50 {carga['rerun_ms_p50']:>8.1f} ms"
+                  f"  p95 {carga['rerun_ms_p95']:>8.1f} ms  RSS pico {carga['rss_pico_mb']:>8.1f} MB"
+                  f"  {carga['mb_por_sesion']:>6.2f} MB/sesión")
+    
+    salida['rss_max_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(salida, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {args.salida} (RSS máximo {salida['rss_max_mb']} MB)", file=sys.stderr)
+    
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(salida, json.load(f))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+🏥 DASHBOARD DE ERRORES API - CLI
+=================================
+Resumen mensual de errores sin navegador (cron, reportes batch).
+
+    python cli.py
+    python cli.py --fuente errores.csv --mes 2025-03 --formato csv -o marzo.csv
+
+Autor: Lizbeth Ramírez | PROA - Ecommerce
+"""
+
+import argparse
+import re
+import sys
+
+from nucleo import FUENTE_DATOS, EstadoIngesta, crear_fuente, filtrar_cubo, resumen_mensual
+
+
+def mes_aaaa_mm(texto):
+    """(año, mes) de un texto AAAA-MM, para `type=` de argparse"""
+    coincide = re.fullmatch(r'(\d{4})-(\d{2})', texto)
+    if not coincide or not 1 <= int(coincide[2]) <= 12:
+        raise argparse.ArgumentTypeError(f"mes inválido {texto!r}: se espera AAAA-MM, ej. 2025-03")
+    return int(coincide[1]), int(coincide[2])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumen mensual de errores de la API")
+    parser.add_argument('--fuente', default=FUENTE_DATOS,
+                        help="URL o ruta del CSV (por defecto el Google Sheet o DASHBOARD_FUENTE)")
+    parser.add_argument('--formato', choices=['json', 'csv'], default='json')
+    parser.add_argument('--mes', type=mes_aaaa_mm, help="solo este mes, como AAAA-MM")
+    parser.add_argument('--severidad', action='append', choices=['CRITICA', 'ALTA', 'MEDIA', 'BAJA'],
+                        help="filtrar por severidad (se puede repetir)")
+    parser.add_argument('-o', '--salida', help="archivo de salida (por defecto la salida estándar)")
+    args = parser.parse_args(argv)
+    
+    estado = EstadoIngesta(crear_fuente(args.fuente))
+    try:
+        estado.actualizar()
+    except (OSError, ValueError) as e:
+        # OSError incluye los errores de red de requests
+        parser.error(f"no se pudo leer la fuente {args.fuente}: {e}")
+    
+    cubo = filtrar_cubo(estado.instantanea.cubo, severidades=args.severidad)
+    resumen = resumen_mensual(cubo)
+    
+    if args.mes and len(resumen):
+        año, mes = args.mes
+        resumen = resumen[(resumen['año'] == año) & (resumen['mes'] == mes)]
+    
+    if args.formato == 'json':
+        texto = resumen.to_json(orient='records', force_ascii=False, indent=2) + '\n'
+    else:
+        texto = resumen.to_csv(index=False)
+    
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        sys.stdout.write(texto)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+🏥 DASHBOARD DE ERRORES API - GRÁFICOS
+======================================
+Figuras de Plotly del dashboard, construidas a partir del cubo de
+agregados (o de las filas, para los mensajes). No dependen de Streamlit.
+
+Autor: Lizbeth Ramírez | PROA - Ecommerce
+"""
+
+import collections
+import threading
+
+import numpy as np
+import plotly.graph_objects as go
+
+from nucleo import RESOLUCIONES, conteo_por, total_por
+from perfilado import perfilado
+
+# ============================================
+# COLORES PROA
+# ============================================
+COLORS = {
+    'bg_dark': '#0A1628',
+    'bg_card': '#0D1B2A',
+    'border': '#1B3A5C',
+    'blue': '#0066B3',
+    'blue_light': '#3B9EE8',
+    'cyan': '#00B4D8',
+    'white': '#FFFFFF',
+    'gray': '#8B9AAF',
+    'green': '#10B981',
+    'yellow': '#F59E0B',
+    'red': '#EF4444',
+}
+
+# ============================================
+# TEMA COMPARTIDO
+# ============================================
+# Estilo común de todas las figuras; reemplaza a la plantilla por defecto de
+# Plotly, que se serializaba completa (~7 KB) dentro de cada gráfico
+PLANTILLA = go.layout.Template(layout=dict(
+    plot_bgcolor=COLORS['bg_card'],
+    paper_bgcolor='rgba(0,0,0,0)',
+    font=dict(color=COLORS['white']),
+    xaxis=dict(gridcolor=COLORS['border'], zeroline=False),
+    yaxis=dict(gridcolor=COLORS['border'], zeroline=False),
+    hoverlabel=dict(bgcolor=COLORS['bg_dark']),
+))
+
+# Desde cuántos puntos una serie se dibuja con WebGL (Scattergl)
+PUNTOS_WEBGL = 1000
+
+# Formato de las fechas del eje x según la resolución (sin segundos ni zona)
+FORMATO_FECHA = {'h': '%Y-%m-%d %H:%M', 'D': '%Y-%m-%d'}
+
+def _enteros(valores):
+    """Conteos (no negativos) en el tipo entero más chico que los contiene; así
+    viaja al navegador el arreglo binario más corto"""
+    valores = np.asarray(valores)
+    if len(valores) == 0:
+        return valores
+    return valores.astype(np.min_scalar_type(int(valores.max())))
+
+class CacheFiguras:
+    """Figuras ya construidas por clave (huella de los datos + filtros), con desalojo LRU.
+
+    Con los mismos datos y filtros, los reruns de cualquier sesión reusan la
+    figura en lugar de volver a agregar y armarla.
+    """
+    
+    def __init__(self, max_entradas=256):
+        self.max_entradas = max_entradas
+        self._figuras = collections.OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obtener(self, clave, construir):
+        with self._lock:
+            if clave in self._figuras:
+                self._figuras.move_to_end(clave)
+                return self._figuras[clave]
+        
+        fig = construir()
+        with self._lock:
+            self._figuras[clave] = fig
+            while len(self._figuras) > self.max_entradas:
+                self._figuras.popitem(last=False)
+        return fig
+
+# ============================================
+# GRÁFICOS
+# ============================================
+def _marcar_anomalias(fig, anomalias, clave, x, y):
+    """Agrega marcadores de picos sobre la traza (x, y); `clave` ubica cada pico en x"""
+    if anomalias is None or len(anomalias) == 0:
+        return
+    
+    posiciones = {valor: i for i, valor in enumerate(x)}
+    puntos = {}
+    for hora, tipo, n, esperado in anomalias[['hora', 'tipo_error', 'n', 'esperado']].itertuples(index=False):
+        i = posiciones.get(clave(hora))
+        if i is not None:
+            puntos.setdefault(i, []).append(f"{tipo}: {n} a las {hora:%H:%M} (esperado ~{esperado:g})")
+    if not puntos:
+        return
+    
+    fig.add_trace(go.Scatter(
+        x=[x[i] for i in puntos],
+        y=[y[i] for i in puntos],
+        mode='markers',
+        marker=dict(color=COLORS['red'], size=12, symbol='x'),
+        hovertext=['<br>'.join(textos) for textos in puntos.values()],
+        hoverinfo='text',
+        name='Picos',
+        showlegend=False
+    ))
+
+@perfilado
+def grafico_tendencia_diaria(cubo, anomalias=None):
+    """Tendencia diaria del mes seleccionado, con los picos detectados"""
+    if 'dia' not in cubo.columns:
+        return None
+    
+    por_dia = conteo_por(cubo, 'dia').reset_index(name='Errores')
+    if len(por_dia) == 0:
+        return None
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=_enteros(por_dia['dia']),
+        y=_enteros(por_dia['Errores']),
+        mode='lines+markers',
+        line=dict(color=COLORS['cyan'], width=2),
+        marker=dict(size=6),
+        fill='tozeroy',
+        fillcolor='rgba(0, 180, 216, 0.1)'
+    ))
+    _marcar_anomalias(fig, anomalias, lambda hora: hora.day, por_dia['dia'].tolist(), por_dia['Errores'].tolist())
+    
+    fig.update_layout(
+        title='📅 Errores por Día del Mes',
+        xaxis=dict(title='Día', tickmode='linear', dtick=1),
+        yaxis=dict(title=''),
+        height=350,
+        template=PLANTILLA
+    )
+    return fig
+
+@perfilado
+def grafico_serie_temporal(serie, resolucion, anomalias=None):
+    """Tendencia del histórico a resolución de hora o día, con los picos detectados"""
+    if resolucion is None or len(serie) == 0:
+        return None
+    
+    periodos = serie.index
+    etiquetas = periodos.strftime(FORMATO_FECHA[resolucion]).tolist()
+    traza = go.Scattergl if len(serie) >= PUNTOS_WEBGL else go.Scatter
+    
+    fig = go.Figure()
+    fig.add_trace(traza(
+        x=etiquetas,
+        y=_enteros(serie),
+        mode='lines',
+        line=dict(color=COLORS['cyan'], width=2),
+        fill='tozeroy',
+        fillcolor='rgba(0, 180, 216, 0.1)'
+    ))
+    
+    def periodo_de(hora):
+        # Cada punto se etiqueta con el inicio de su hora o día
+        i = periodos.searchsorted(hora, 'right') - 1
+        return etiquetas[min(max(i, 0), len(periodos) - 1)]
+    
+    _marcar_anomalias(fig, anomalias, periodo_de, etiquetas, serie.tolist())
+    
+    fig.update_layout(
+        title=f'📈 Errores por {RESOLUCIONES[resolucion].capitalize()}',
+        xaxis=dict(title='', type='date'),
+        yaxis=dict(title=''),
+        height=350,
+        template=PLANTILLA
+    )
+    return fig
+
+@perfilado
+def grafico_coincidencias(conteo, consulta):
+    """Coincidencias de una búsqueda por día (`conteo` de `conteo_diario`)"""
+    if len(conteo) == 0:
+        return None
+    
+    fig = go.Figure(go.Bar(
+        x=conteo.index.strftime(FORMATO_FECHA['D']).tolist(),
+        y=_enteros(conteo.to_numpy()),
+        marker=dict(color=COLORS['cyan']),
+    ))
+    fig.update_layout(
+        title=f'🔎 Coincidencias por día: "{consulta}"',
+        xaxis=dict(title='', type='date'),
+        yaxis=dict(title=''),
+        height=250,
+        template=PLANTILLA
+    )
+    return fig
+
+@perfilado
+def grafico_por_tipo(cubo):
+    if 'tipo_error' not in cubo.columns:
+        return None
+    
+    conteo = total_por(cubo, 'tipo_error').head(10).reset_index()
+    conteo.columns = ['Tipo', 'Cantidad']
+    
+    if len(conteo) == 0:
+        return None
+    
+    fig = go.Figure(go.Bar(
+        x=_enteros(conteo['Cantidad']),
+        y=conteo['Tipo'],
+        customdata=conteo['Tipo'],
+        orientation='h',
+        marker=dict(color=_enteros(conteo['Cantidad']), colorscale=[[0, COLORS['blue']], [1, COLORS['cyan']]]),
+        text=_enteros(conteo['Cantidad']),
+        textposition='auto'
+    ))
+    
+    fig.update_layout(
+        title='📊 Top 10 Tipos de Error',
+        xaxis=dict(title=''),
+        yaxis=dict(title='', categoryorder='total ascending'),
+        height=400,
+        template=PLANTILLA
+    )
+    return fig
+
+@perfilado
+def grafico_severidad(cubo):
+    if 'severidad' not in cubo.columns:
+        return None
+    
+    conteo = total_por(cubo, 'severidad').reset_index()
+    conteo.columns = ['Severidad', 'Cantidad']
+    
+    if len(conteo) == 0:
+        return None
+    
+    colores_map = {'CRITICA': COLORS['red'], 'ALTA': COLORS['yellow'], 
+                   'MEDIA': COLORS['blue_light'], 'BAJA': COLORS['green']}
+    colores = [colores_map.get(s, COLORS['gray']) for s in conteo['Severidad']]
+    
+    fig = go.Figure(go.Pie(
+        labels=conteo['Severidad'],
+        values=_enteros(conteo['Cantidad']),
+        hole=0.6,
+        marker=dict(colors=colores)
+    ))
+    
+    fig.update_layout(
+        title='🎯 Distribución por Severidad',
+        height=350,
+        template=PLANTILLA
+    )
+    return fig
+
+@perfilado
+def grafico_mensajes_error(top, error=0):
+    """Gráfico de los mensajes de error más frecuentes (agrupados por plantilla).
+
+    `top` viene de `Instantanea.mas_frecuentes`; con `error` los conteos son
+    aproximados y se indica la cota en el título.
+    """
+    conteo = top.reset_index()
+    conteo.columns = ['Mensaje', 'Cantidad']
+    
+    if len(conteo) == 0:
+        return None
+    
+    # Truncar mensajes largos
+    conteo['Mensaje_corto'] = conteo['Mensaje'].apply(lambda x: str(x)[:50] + '...' if len(str(x)) > 50 else str(x))
+    
+    fig = go.Figure(go.Bar(
+        x=_enteros(conteo['Cantidad']),
+        y=conteo['Mensaje_corto'],
+        orientation='h',
+        marker=dict(color=_enteros(conteo['Cantidad']), colorscale=[[0, COLORS['red']], [1, COLORS['yellow']]]),
+        text=_enteros(conteo['Cantidad']),
+        textposition='auto',
+        hovertext=conteo['Mensaje'],
+        customdata=conteo['Mensaje'],
+        hoverinfo='text+x'
+    ))
+    
+    fig.update_layout(
+        title='💬 Top 10 Mensajes de Error' + (f' (aprox., error ≤ {error:,})' if error else ''),
+        xaxis=dict(title=''),
+        yaxis=dict(title='', categoryorder='total ascending'),
+        height=400,
+        template=PLANTILLA
+    )
+    return fig
+
+@perfilado
+def grafico_por_hora(cubo, anomalias=None):
+    if 'hora' not in cubo.columns:
+        return None
+    
+    por_hora = conteo_por(cubo, 'hora').reset_index(name='Errores')
+    if len(por_hora) == 0:
+        return None
+    
+    fig = go.Figure(go.Bar(
+        x=_enteros(por_hora['hora']),
+        y=_enteros(por_hora['Errores']),
+        customdata=_enteros(por_hora['hora']),
+        marker=dict(color=_enteros(por_hora['Errores']), colorscale=[[0, COLORS['blue']], [1, COLORS['cyan']]]),
+        text=_enteros(por_hora['Errores']),
+        textposition='auto'
+    ))
+    _marcar_anomalias(fig, anomalias, lambda hora: hora.hour, por_hora['hora'].tolist(), por_hora['Errores'].tolist())
+    
+    fig.update_layout(
+        title='🕐 Errores por Hora del Día',
+        xaxis=dict(title='Hora', tickmode='linear', dtick=2),
+        yaxis=dict(title=''),
+        height=300,
+        template=PLANTILLA
+    )
+    return fig
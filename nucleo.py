@@ -0,0 +1,2169 @@
+# -*- coding: utf-8 -*-
+"""
+🏥 DASHBOARD DE ERRORES API - NÚCLEO DE ANÁLISIS
+================================================
+Carga, filtrado y agregación de los datos del dashboard sin depender de
+Streamlit ni de Plotly: se puede importar desde scripts, benchmarks o la
+CLI (`cli.py`).
+
+Autor: Lizbeth Ramírez | PROA - Ecommerce
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import copy
+import functools
+import gzip
+import hashlib
+import importlib.util
+import io
+import itertools
+import logging
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import requests
+from pandas.api.types import union_categoricals
+from requests.adapters import HTTPAdapter
+
+from perfilado import perfilado
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# 🔗 TU GOOGLE SHEET
+# ============================================
+GOOGLE_SHEET_ID = "1ycVV-aBUBhlPdJk9s3wSvaZflyMbSpmG1OpmB9rZof8"
+GOOGLE_SHEET_URL = f"https://docs.google.com/spreadsheets/d/{GOOGLE_SHEET_ID}/export?format=csv"
+
+# Fuente alternativa para pruebas sin Google: ruta a un CSV local o URL http://localhost
+FUENTE_DATOS = os.environ.get("DASHBOARD_FUENTE", GOOGLE_SHEET_URL)
+
+# Varias fuentes, una por API: "nombre=fuente[|timeout]" separadas por ';' o
+# saltos de línea; la fuente es un ID de Google Sheet, una URL o una ruta.
+# Ej.: DASHBOARD_FUENTES="proa=1ycVV...;labs=https://host/errores.csv|20"
+FUENTES_DATOS = os.environ.get("DASHBOARD_FUENTES", f"proa={FUENTE_DATOS}")
+
+# Segundos máximos de descarga por fuente (si no se indica otro en su definición)
+TIMEOUT_FUENTE = 60
+
+# Segundos entre refrescos de la fuente
+TTL_REFRESCO = 300
+
+# Carpeta de las instantáneas en disco (Parquet) para arrancar sin esperar a
+# la descarga; vacío las desactiva. Requieren pyarrow.
+DIR_INSTANTANEAS = os.environ.get(
+    "DASHBOARD_DIR_INSTANTANEAS",
+    os.path.join(os.path.expanduser('~'), '.cache', 'proa_dashboard'),
+)
+
+# Formato de las instantáneas guardadas; cambiarlo descarta las anteriores
+VERSION_INSTANTANEA = 7
+
+# Modo compacto: columnas de texto como categorías (diccionario compartido
+# de valores + códigos enteros por fila). DASHBOARD_MODO_COMPACTO=0 lo desactiva.
+MODO_COMPACTO = os.environ.get("DASHBOARD_MODO_COMPACTO", "1") != "0"
+_TEXTO = 'category' if MODO_COMPACTO else str
+
+# Columnas que usa el dashboard y su tipo; el resto del CSV no se carga
+ESQUEMA = {
+    'fecha': str,
+    'severidad': _TEXTO,
+    'tipo_error': _TEXTO,
+    'error_message': _TEXTO,
+}
+
+# Períodos con más filas que esto sacan los mensajes más frecuentes de los
+# resúmenes por mes (aproximados, con cota de error) en lugar de contarlos
+UMBRAL_TOP_EXACTO = int(os.environ.get("DASHBOARD_UMBRAL_TOP_EXACTO", "1000000"))
+
+# Zona horaria del dashboard: las fechas sin zona se toman como de esta zona
+# y las que traen una (Z, -05:00...) se convierten a ella
+ZONA_HORARIA = os.environ.get("DASHBOARD_ZONA_HORARIA", "UTC")
+
+# Filas por bloque al parsear (acota el pico de memoria en exportaciones grandes)
+FILAS_POR_BLOQUE = 100_000
+
+# Nombres de meses en español
+MESES_ES = {
+    1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril',
+    5: 'Mayo', 6: 'Junio', 7: 'Julio', 8: 'Agosto',
+    9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
+}
+
+# ============================================
+# FUENTES DE DATOS
+# ============================================
+class FuenteDatos:
+    """Origen de un CSV de errores; cada backend implementa `leer()`"""
+    
+    nombre = 'fuente'
+    
+    def leer(self):
+        """Devuelve el CSV completo como bytes"""
+        raise NotImplementedError
+    
+    def leer_condicional(self, validador=None):
+        """(contenido, validador); contenido es None si no cambió desde `validador`.
+
+        Por defecto no hay validadores y siempre se lee todo.
+        """
+        return self.leer(), None
+    
+    def identidad(self):
+        """Qué se está leyendo; distingue instantáneas guardadas de fuentes distintas"""
+        return self.nombre
+
+@functools.cache
+def sesion_http():
+    """Sesión HTTP del proceso: todas las fuentes y refrescos reutilizan sus conexiones"""
+    sesion = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+    sesion.mount('http://', adaptador)
+    sesion.mount('https://', adaptador)
+    return sesion
+
+class FuenteHTTP(FuenteDatos):
+    """CSV servido por HTTP (p. ej. el stub local de `servidor_csv_local`)"""
+    
+    nombre = 'http'
+    
+    def __init__(self, url, timeout=TIMEOUT_FUENTE):
+        self.url = url
+        self.timeout = timeout
+    
+    def leer(self):
+        return self.leer_condicional()[0]
+    
+    def leer_condicional(self, validador=None):
+        """GET condicional con el ETag / Last-Modified de la lectura anterior"""
+        encabezados = {}
+        if validador:
+            etag, modificado = validador
+            if etag:
+                encabezados['If-None-Match'] = etag
+            if modificado:
+                encabezados['If-Modified-Since'] = modificado
+        
+        resp = sesion_http().get(self.url, headers=encabezados, timeout=(min(10, self.timeout), self.timeout))
+        if resp.status_code == 304:
+            return None, validador
+        resp.raise_for_status()
+        
+        nuevo = (resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+        return resp.content, nuevo if any(nuevo) else None
+    
+    def identidad(self):
+        return self.url
+
+class FuenteGoogleSheet(FuenteHTTP):
+    """Exportación CSV de un Google Sheet"""
+    
+    nombre = 'google_sheet'
+    
+    def __init__(self, sheet_id, timeout=TIMEOUT_FUENTE):
+        super().__init__(
+            f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv",
+            timeout=timeout,
+        )
+
+class FuenteArchivo(FuenteDatos):
+    """CSV en disco"""
+    
+    nombre = 'archivo'
+    
+    def __init__(self, ruta):
+        self.ruta = ruta
+    
+    def leer(self):
+        with open(self.ruta, 'rb') as f:
+            return f.read()
+    
+    def leer_condicional(self, validador=None):
+        """Solo lee el archivo si cambiaron su tamaño o su fecha de modificación"""
+        info = os.stat(self.ruta)
+        nuevo = (info.st_mtime_ns, info.st_size)
+        if nuevo == validador:
+            return None, validador
+        return self.leer(), nuevo
+    
+    def identidad(self):
+        return os.path.abspath(self.ruta)
+
+def crear_fuente(descriptor, timeout=TIMEOUT_FUENTE):
+    """Crea la fuente adecuada a partir de un ID de Google Sheet, una URL o una ruta"""
+    if descriptor == GOOGLE_SHEET_URL:
+        return FuenteGoogleSheet(GOOGLE_SHEET_ID, timeout=timeout)
+    if descriptor.startswith(('http://', 'https://')):
+        return FuenteHTTP(descriptor, timeout=timeout)
+    if re.fullmatch(r'[\w-]{40,}', descriptor) and not os.path.exists(descriptor):
+        return FuenteGoogleSheet(descriptor, timeout=timeout)
+    return FuenteArchivo(descriptor)
+
+def crear_fuentes(definicion):
+    """{nombre: fuente} a partir de "nombre=fuente[|timeout]" separadas por ';' o saltos de línea"""
+    fuentes = {}
+    for entrada in re.split(r'[;\n]', definicion):
+        if not entrada.strip():
+            continue
+        # Solo lleva nombre si empieza con "nombre="; el '=' de una URL (?format=csv) no cuenta
+        con_nombre = re.match(r'\s*([\w-]+)=(.*)', entrada, re.S)
+        if con_nombre:
+            nombre, descriptor = con_nombre.groups()
+        else:
+            nombre, descriptor = f'fuente_{len(fuentes) + 1}', entrada
+        descriptor, _, timeout = descriptor.strip().partition('|')
+        fuentes[nombre.strip()] = crear_fuente(descriptor, float(timeout) if timeout else TIMEOUT_FUENTE)
+    if not fuentes:
+        raise ValueError("No se definió ninguna fuente de datos")
+    return fuentes
+
+def servidor_csv_local(ruta, puerto=0, retraso=0):
+    """Sirve un CSV local por HTTP para probar sin Google; devuelve (servidor, url).
+
+    `retraso` (segundos antes de responder) simula un sheet lento; si la ruta
+    no existe responde 404. Envía ETag y responde 304 si no cambió.
+    """
+    
+    class _Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(retraso)
+            if not os.path.exists(ruta):
+                self.send_error(404)
+                return
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            etag = '"' + hashlib.blake2b(contenido, digest_size=16).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Content-Length', str(len(contenido)))
+            self.end_headers()
+            self.wfile.write(contenido)
+        
+        def log_message(self, *args):
+            pass
+    
+    servidor = ThreadingHTTPServer(('127.0.0.1', puerto), _Manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}/"
+
+# ============================================
+# HUELLAS DE MENSAJES
+# ============================================
+# Partes variables de un mensaje (IDs, fechas, UUIDs...), su marcador y un
+# filtro que cumple todo texto donde el patrón puede coincidir (solo ASCII,
+# válido igual para RE2 de Arrow que para `re`). El orden importa: los
+# patrones específicos van antes que <NUM>.
+PATRONES_VARIABLES = [
+    (re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', re.I), '<UUID>', r'(?i)[0-9a-f]{8}-'),
+    (re.compile(r'https?://\S+'), '<URL>', r'https?://'),
+    (re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+'), '<EMAIL>', r'@'),
+    (re.compile(r'\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?\b'), '<FECHA>',
+     r'[0-9]{4}-[0-9]{2}-'),
+    (re.compile(r'\b\d{1,2}/\d{1,2}/\d{2,4}\b'), '<FECHA>', r'[0-9]/[0-9]'),
+    (re.compile(r'\b\d{1,2}:\d{2}(?::\d{2})?\b'), '<HORA>', r'[0-9]:[0-9]'),
+    (re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}\b'), '<IP>', r'[0-9]\.[0-9]'),
+    (re.compile(r'\b(?:0x)?(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{8,}\b', re.I), '<HEX>', r'(?i)[0-9a-f]{8}'),
+    (re.compile(r'\b[A-Za-z]+[-_]?\d{3,}[\w-]*\b'), '<ID>', r'[A-Za-z][-_]?[0-9]{3}'),
+    (re.compile(r'\d+(?:[.,]\d+)?'), '<NUM>', r'[0-9]'),
+]
+
+# Con pyarrow los filtros corren en RE2 también en pandas 2
+_DTYPE_FILTROS = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') is not None else 'str'
+_OTRO_DIGITO = re.compile(r'(?![0-9])\d')
+
+# Plantilla ya calculada de cada mensaje, entre refrescos y reconstrucciones (LRU)
+MAX_PLANTILLAS_EN_MEMORIA = 1_000_000
+_plantillas_vistas = collections.OrderedDict()
+_lock_plantillas = threading.Lock()
+
+def huellas(mensajes):
+    """Plantilla de cada mensaje, con las partes variables reemplazadas por marcadores.
+
+    Los `PATRONES_VARIABLES` se aplican en orden; cada uno solo a los mensajes
+    que pasan su filtro, evaluado vectorizado sobre todos.
+    """
+    texto = np.array(mensajes, dtype=object)
+    if len(texto) == 0:
+        return texto
+    
+    # Los filtros buscan dígitos ASCII; `\d` de `re` también acepta otros
+    # dígitos Unicode, así que esos mensajes (raros) pasan todos los filtros
+    serie = pd.Series(texto, dtype=_DTYPE_FILTROS)
+    no_ascii = np.flatnonzero(serie.str.contains(r'[^\x00-\x7f]').to_numpy(dtype=bool))
+    otros_digitos = np.zeros(len(texto), dtype=bool)
+    otros_digitos[no_ascii] = [_OTRO_DIGITO.search(m) is not None for m in texto[no_ascii]]
+    
+    for patron, marcador, filtro in PATRONES_VARIABLES:
+        candidatos = np.flatnonzero(serie.str.contains(filtro).to_numpy(dtype=bool) | otros_digitos)
+        if len(candidatos):
+            texto[candidatos] = [patron.sub(marcador, m) for m in texto[candidatos]]
+            serie = pd.Series(texto, dtype=_DTYPE_FILTROS)
+    return texto
+
+def plantillas(serie):
+    """Columna categórica con la plantilla de cada mensaje.
+
+    Solo se calcula la huella de cada mensaje distinto (las categorías) que
+    no se haya visto antes, en lote con `huellas`; el resto sale del LRU.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype('category')
+    
+    mensajes = [str(m) for m in serie.cat.categories]
+    with _lock_plantillas:
+        etiquetas = np.array([_plantillas_vistas.get(m) for m in mensajes], dtype=object)
+    sin_ver = np.flatnonzero(pd.isna(etiquetas))
+    if len(sin_ver):
+        etiquetas[sin_ver] = huellas([mensajes[i] for i in sin_ver])
+    with _lock_plantillas:
+        for mensaje, etiqueta in zip(mensajes, etiquetas):
+            _plantillas_vistas[mensaje] = etiqueta
+            _plantillas_vistas.move_to_end(mensaje)
+        while len(_plantillas_vistas) > MAX_PLANTILLAS_EN_MEMORIA:
+            _plantillas_vistas.popitem(last=False)
+    
+    categorias, inversa = np.unique(etiquetas, return_inverse=True) if len(etiquetas) else (etiquetas, etiquetas)
+    codigos = serie.cat.codes.to_numpy()
+    nuevos = np.where(codigos >= 0, inversa[codigos] if len(inversa) else -1, -1)
+    return pd.Series(
+        pd.Categorical.from_codes(nuevos, categories=categorias),
+        index=serie.index,
+        name='plantilla',
+    )
+
+# ============================================
+# FECHAS
+# ============================================
+# Formatos que se prueban para `fecha`; ante empates gana el primero (día
+# antes que mes, como exporta una hoja en español)
+FORMATOS_FECHA = [
+    'ISO8601',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+    '%d-%m-%Y %H:%M:%S',
+    '%d-%m-%Y %H:%M',
+    '%d-%m-%Y',
+]
+
+# Valores con los que se elige el formato de lo que falta parsear
+MUESTRA_FORMATO = 500
+
+# Textos ya parseados con formatos distintos de ISO que se recuerdan entre
+# refrescos (ISO lo parsea pandas en C, más rápido que buscarlo en la caché)
+MAX_FECHAS_EN_CACHE = 500_000
+
+# Desfase UTC al final de una hora (10:30:00Z, 10:30-05:00, 10:30:00.5 +0530)
+PATRON_ZONA = re.compile(r'^(.*\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)\s*(Z|[+-]\d{2}:?\d{2})$')
+PATRON_FORMA_FECHA = re.compile(r'\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}')
+
+_NAT = np.iinfo(np.int64).min
+_fechas_vistas = collections.defaultdict(dict)  # {formato: {texto: microsegundos}}
+_lock_fechas = threading.Lock()
+
+class CalidadFechas:
+    """Filas de `fecha` parseadas con cada formato y las que fallaron, por motivo.
+
+    Se acumula entre refrescos de una fuente; los formatos que ya funcionaron
+    se prueban primero en el siguiente.
+    """
+    
+    MAX_EJEMPLOS = 3
+    
+    def __init__(self):
+        self.filas = 0
+        self.por_formato = collections.Counter()
+        self.fallidas = collections.Counter()
+        self.ejemplos = {}
+    
+    @property
+    def total_fallidas(self):
+        return sum(self.fallidas.values())
+    
+    def registrar_fallo(self, motivo, filas, ejemplos=()):
+        self.fallidas[motivo] += int(filas)
+        vistos = self.ejemplos.setdefault(motivo, [])
+        for ejemplo in ejemplos:
+            if len(vistos) < self.MAX_EJEMPLOS and ejemplo not in vistos:
+                vistos.append(ejemplo)
+    
+    def resumen(self):
+        """Texto corto de las fallas, ej. '12 de 5,000 filas sin fecha (vacía: 10, ...)'"""
+        motivos = ', '.join(f"{motivo}: {n:,}" for motivo, n in self.fallidas.most_common())
+        return f"{self.total_fallidas:,} de {self.filas:,} filas sin fecha ({motivos})"
+
+def _desfases_utc(sufijos):
+    """Minutos al este de UTC de sufijos como 'Z', '-05:00' o '+0530'"""
+    sufijos = sufijos.str.replace(':', '', regex=False)
+    es_z = (sufijos == 'Z').to_numpy()
+    horas = pd.to_numeric(sufijos.str[1:3].where(~es_z, '0')).to_numpy()
+    minutos = pd.to_numeric(sufijos.str[3:5].where(~es_z, '0')).to_numpy()
+    signo = np.where(sufijos.str[0].to_numpy() == '-', -1, 1)
+    return signo * (horas * 60 + minutos)
+
+def _elegir_formato(muestra, preferidos):
+    """El formato que más valores de `muestra` parsea; None si ninguno sirve.
+
+    Si uno de los `preferidos` (los que ya funcionaron) parsea toda la
+    muestra, se toma sin probar los demás.
+    """
+    candidatos = list(dict.fromkeys([*preferidos, *FORMATOS_FECHA]))
+    aciertos = []
+    for formato in candidatos:
+        n = int(pd.to_datetime(muestra, format=formato, errors='coerce').notna().sum())
+        if n == len(muestra) and formato in preferidos:
+            return formato
+        aciertos.append(n)
+    mejor = int(np.argmax(aciertos))
+    return candidatos[mejor] if aciertos[mejor] else None
+
+def _parsear_con_cache(textos, formato):
+    """Microsegundos de cada texto (o `_NAT`); cada texto distinto se parsea una
+    sola vez y los ya vistos en refrescos anteriores salen de la caché"""
+    codigos, distintos = pd.factorize(textos)
+    distintos = np.asarray(distintos, dtype=object)
+    with _lock_fechas:
+        vistas = _fechas_vistas[formato]
+        valores = np.fromiter((vistas.get(t, _NAT) for t in distintos), dtype=np.int64, count=len(distintos))
+    
+    nuevos = np.flatnonzero(valores == _NAT)
+    if len(nuevos):
+        parseados = pd.to_datetime(distintos[nuevos], format=formato, errors='coerce')
+        valores[nuevos] = parseados.to_numpy().astype('datetime64[us]').view(np.int64)
+        validos = nuevos[valores[nuevos] != _NAT]
+        with _lock_fechas:
+            vistas = _fechas_vistas[formato]
+            if len(vistas) + len(validos) > MAX_FECHAS_EN_CACHE:
+                vistas.clear()
+            vistas.update(zip(distintos[validos], valores[validos].tolist()))
+    return valores[codigos]
+
+def parsear_fechas(serie, calidad=None):
+    """Columna `fecha` como datetime64 sin zona, en `ZONA_HORARIA`.
+
+    Elige el formato con una muestra y lo aplica vectorizado a todo lo que
+    falta, hasta que ningún formato sirva; así una columna con formatos
+    mezclados no pierde filas. Lo que queda sin parsear es NaT y se cuenta
+    en `calidad` con su motivo.
+    """
+    calidad = calidad if calidad is not None else CalidadFechas()
+    calidad.filas += len(serie)
+    # Los nulos se marcan antes de `astype(str)`, que en pandas 2 los vuelve 'nan'
+    nulas = serie.isna().to_numpy()
+    texto = serie.astype(str).str.strip().reset_index(drop=True)
+    microsegundos = np.full(len(texto), _NAT, dtype=np.int64)
+    
+    vacias = nulas | (texto == '').to_numpy()
+    if vacias.any():
+        calidad.registrar_fallo('vacía', vacias.sum())
+    
+    # La zona se separa antes de elegir el formato y se aplica al final
+    con_zona = np.flatnonzero(texto.str.match(PATRON_ZONA, na=False).to_numpy())
+    if len(con_zona):
+        partes = texto.take(con_zona).str.extract(PATRON_ZONA)
+        texto = texto.copy()
+        texto.iloc[con_zona] = partes[0].to_numpy()
+        desfases = _desfases_utc(partes[1])
+    
+    pendientes = np.flatnonzero(~vacias)
+    preferidos = [formato for formato, _ in calidad.por_formato.most_common()]
+    while len(pendientes):
+        formato = _elegir_formato(texto.take(pendientes[:MUESTRA_FORMATO]), preferidos)
+        if formato is None:
+            break
+        if formato == 'ISO8601':
+            fechas = pd.to_datetime(texto.take(pendientes), format=formato, errors='coerce')
+            valores = fechas.to_numpy().astype('datetime64[us]').view(np.int64)
+        else:
+            valores = _parsear_con_cache(texto.take(pendientes), formato)
+        ok = valores != _NAT
+        microsegundos[pendientes[ok]] = valores[ok]
+        calidad.por_formato[formato] += int(ok.sum())
+        preferidos.append(formato)
+        pendientes = pendientes[~ok]
+    
+    if len(pendientes):
+        fallidas = serie.take(pendientes)
+        con_forma = fallidas.astype(str).str.contains(PATRON_FORMA_FECHA, na=False).to_numpy(dtype=bool)
+        for motivo, grupo in (('fecha inválida', fallidas[con_forma]), ('formato no reconocido', fallidas[~con_forma])):
+            if len(grupo):
+                calidad.registrar_fallo(motivo, len(grupo), grupo.head(CalidadFechas.MAX_EJEMPLOS).tolist())
+    
+    fechas = microsegundos.view('datetime64[us]')
+    if len(con_zona):
+        ok = microsegundos[con_zona] != _NAT
+        utc = pd.Series(fechas[con_zona[ok]] - desfases[ok].astype('timedelta64[m]'))
+        fechas = fechas.copy()
+        fechas[con_zona[ok]] = utc.dt.tz_localize('UTC').dt.tz_convert(ZONA_HORARIA).dt.tz_localize(None).to_numpy()
+    return pd.Series(fechas, index=serie.index, name=serie.name)
+
+# ============================================
+# PARSEO
+# ============================================
+def leer_encabezado(contenido):
+    """Nombres de columna del CSV (solo lee la primera línea)"""
+    return list(pd.read_csv(io.BytesIO(contenido), nrows=0).columns)
+
+def concatenar_bloques(bloques):
+    """Concatena bloques unificando las categorías para no perder el tipo categórico"""
+    bloques = [b for b in bloques if len(b)] or bloques[:1]
+    if not bloques:
+        return pd.DataFrame()
+    if len(bloques) == 1:
+        return bloques[0].reset_index(drop=True)
+    
+    # La unión de categorías ya trae los códigos concatenados; pasarlas por
+    # pd.concat obligaría a comparar (hashear) el diccionario en cada bloque
+    columnas = list(bloques[0].columns)
+    categoricas = {
+        col: union_categoricals([b[col] for b in bloques], sort_categories=True)
+        for col in columnas
+        if isinstance(bloques[0][col].dtype, pd.CategoricalDtype)
+    }
+    df = pd.concat([b.drop(columns=list(categoricas)) for b in bloques], ignore_index=True)
+    for col, valores in categoricas.items():
+        df[col] = valores
+    return df[columnas]
+
+def parsear_csv(contenido, nombres=None, calidad=None):
+    """Parsea bytes CSV por bloques, tipado y solo con las columnas del esquema.
+
+    Con `nombres` el contenido se interpreta como una cola sin encabezado.
+    El resultado del parseo de `fecha` se acumula en `calidad`.
+    """
+    opciones = dict(
+        usecols=lambda c: c in ESQUEMA,
+        dtype=ESQUEMA,
+        chunksize=FILAS_POR_BLOQUE,
+    )
+    if nombres is not None:
+        opciones.update(header=None, names=nombres)
+    
+    bloques = []
+    with pd.read_csv(io.BytesIO(contenido), **opciones) as lector:
+        for bloque in lector:
+            if 'fecha' in bloque.columns:
+                bloque['fecha'] = parsear_fechas(bloque['fecha'], calidad)
+            bloques.append(bloque.dropna(how='all'))
+    
+    df = concatenar_bloques(bloques)
+    if 'error_message' in df.columns:
+        df['plantilla'] = plantillas(df['error_message'])
+    return df
+
+# ============================================
+# CONTEOS Y MEMORIA
+# ============================================
+@perfilado
+def contar_top(serie, n):
+    """Los `n` valores más frecuentes (sin nulos ni vacíos).
+
+    En columnas categóricas cuenta sobre los códigos enteros con bincount
+    en lugar de hashear cada string.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        conteo = serie.dropna().value_counts()
+        return conteo[conteo.index != ''].head(n)
+    
+    codigos = serie.cat.codes.to_numpy()
+    categorias = serie.cat.categories
+    conteos = np.bincount(codigos[codigos >= 0], minlength=len(categorias))
+    conteos[categorias == ''] = 0
+    
+    k = min(n, int((conteos > 0).sum()))
+    if k == 0:
+        return pd.Series(dtype='int64')
+    top = np.argpartition(conteos, -k)[-k:]
+    top = top[np.argsort(conteos[top], kind='stable')[::-1]]
+    return pd.Series(conteos[top], index=categorias[top])
+
+def reporte_memoria(df):
+    """Memoria por columna en la representación actual frente a strings de Python"""
+    filas = []
+    for col in df.columns:
+        tipo = df[col].dtype
+        actual = df[col].memory_usage(index=False, deep=True)
+        if pd.api.types.is_numeric_dtype(tipo) or pd.api.types.is_datetime64_any_dtype(tipo):
+            como_objeto = actual
+        else:
+            como_objeto = df[col].astype(object).memory_usage(index=False, deep=True)
+        filas.append({
+            'Columna': col,
+            'Tipo': str(tipo),
+            'Actual (MB)': round(actual / 1e6, 2),
+            'Como objeto (MB)': round(como_objeto / 1e6, 2),
+            'Reducción': f"{como_objeto / max(actual, 1):.1f}x",
+        })
+    return pd.DataFrame(filas)
+
+# ============================================
+# FRECUENTES APROXIMADOS
+# ============================================
+# Columna que resumen los más frecuentes y contadores por resumen
+COLUMNA_TOP = 'plantilla'
+CONTADORES_RESUMEN = 512
+
+class ResumenFrecuentes:
+    """Resumen combinable de los valores más frecuentes (Misra-Gries / SpaceSaving).
+
+    Guarda a lo sumo `CONTADORES_RESUMEN` contadores. Cada conteo es una cota
+    inferior: el real está en [conteo, conteo + error], y un valor que no
+    aparece se vio a lo sumo `error` veces, con error <= n / (contadores + 1).
+    """
+    
+    __slots__ = ('valores', 'conteos', 'n', 'error')
+    
+    def __init__(self, valores, conteos, n, error=0):
+        conteos = np.asarray(conteos, dtype=np.int64)
+        if len(conteos) > CONTADORES_RESUMEN:
+            # Se descuenta el contador k+1 a todos y se quedan los positivos
+            orden = np.argsort(-conteos, kind='stable')
+            corte = conteos[orden[CONTADORES_RESUMEN]]
+            orden = orden[:CONTADORES_RESUMEN]
+            orden = orden[conteos[orden] > corte]
+            valores, conteos = np.asarray(valores)[orden], conteos[orden] - corte
+            error += int(corte)
+        self.valores = np.asarray(valores, dtype=object)
+        self.conteos = conteos
+        self.n = int(n)
+        self.error = error
+    
+    @classmethod
+    def de_serie(cls, serie):
+        """Resumen de los valores de `serie` (se cuentan exactos y se recortan)"""
+        conteo = contar_top(serie, len(serie))
+        return cls(conteo.index.to_numpy(object), conteo.to_numpy(), int(conteo.sum()))
+    
+    @classmethod
+    def combinar(cls, resumenes):
+        """Suma de resúmenes: los errores se suman y sigue valiendo la cota"""
+        resumenes = list(resumenes)
+        if len(resumenes) == 1:
+            return resumenes[0]
+        if not resumenes:
+            return cls([], [], 0)
+        
+        codigos, valores = pd.factorize(np.concatenate([r.valores for r in resumenes]))
+        conteos = np.bincount(codigos, weights=np.concatenate([r.conteos for r in resumenes]), minlength=len(valores))
+        return cls(
+            np.asarray(valores, dtype=object),
+            conteos.astype(np.int64),
+            sum(r.n for r in resumenes),
+            sum(r.error for r in resumenes),
+        )
+    
+    def top(self, n):
+        """Los `n` valores con mayor conteo, como `contar_top`"""
+        orden = np.argsort(-self.conteos, kind='stable')[:n]
+        return pd.Series(self.conteos[orden], index=pd.Index(self.valores[orden]))
+
+def resumenes_por_severidad(df):
+    """Un `ResumenFrecuentes` de `COLUMNA_TOP` por severidad (nula incluida)"""
+    if COLUMNA_TOP not in df.columns:
+        return {}
+    if 'severidad' not in df.columns:
+        return {None: ResumenFrecuentes.de_serie(df[COLUMNA_TOP])}
+    grupos = df[COLUMNA_TOP].groupby(df['severidad'], observed=True, dropna=False)
+    return {
+        (None if pd.isna(severidad) else severidad): ResumenFrecuentes.de_serie(serie)
+        for severidad, serie in grupos
+    }
+
+# ============================================
+# CUBO DE AGREGADOS
+# ============================================
+DIMENSIONES_CUBO = ['año', 'mes', 'dia', 'hora', 'severidad', 'tipo_error', 'fuente']
+
+def construir_cubo(df):
+    """Conteo de errores por (año, mes, día, hora, severidad, tipo_error[, fuente]).
+
+    Se calcula una vez por carga; KPIs y gráficos leen de aquí en lugar de
+    recorrer las filas crudas en cada rerun.
+    """
+    claves = []
+    if 'fecha' in df.columns:
+        fecha = df['fecha'].dt
+        claves += [
+            fecha.year.astype('Int16').rename('año'),
+            fecha.month.astype('Int8').rename('mes'),
+            fecha.day.astype('Int8').rename('dia'),
+            fecha.hour.astype('Int8').rename('hora'),
+        ]
+    claves += [df[col] for col in ('severidad', 'tipo_error', 'fuente') if col in df.columns]
+    
+    if not claves:
+        return pd.DataFrame({'n': [len(df)]})
+    
+    return df.groupby(claves, dropna=False, observed=True).size().reset_index(name='n')
+
+def combinar_cubos(*cubos):
+    """Suma cubos (p. ej. el existente más el de las filas recién ingeridas)"""
+    unidos = pd.concat(cubos, ignore_index=True)
+    dims = [c for c in DIMENSIONES_CUBO if c in unidos.columns]
+    if not dims:
+        return pd.DataFrame({'n': [unidos['n'].sum()]})
+    return unidos.groupby(dims, dropna=False, observed=True)['n'].sum().reset_index()
+
+def catalogo_meses(cubo):
+    """Errores y críticos por (año, mes), del más reciente al más antiguo"""
+    if 'año' not in cubo.columns:
+        return pd.DataFrame(columns=['filas', 'criticos'])
+    con_mes = cubo.dropna(subset=['año', 'mes'])
+    criticos = con_mes['n'].where(con_mes['severidad'] == 'CRITICA', 0) if 'severidad' in con_mes.columns else 0
+    catalogo = (
+        con_mes.assign(filas=con_mes['n'], criticos=criticos)
+        .groupby([con_mes['año'].astype(int), con_mes['mes'].astype(int)])[['filas', 'criticos']].sum()
+    )
+    return catalogo.sort_index(ascending=False)
+
+def combinar_catalogos(*catalogos):
+    """Suma catálogos (el existente más el de las filas recién ingeridas, o varias fuentes)"""
+    con_meses = [catalogo for catalogo in catalogos if len(catalogo)]
+    if len(con_meses) <= 1:
+        return con_meses[0] if con_meses else catalogos[0]
+    return pd.concat(con_meses).groupby(level=[0, 1]).sum().sort_index(ascending=False)
+
+@perfilado
+def filtrar_cubo(cubo, año=None, mes=None, severidades=None, fuentes=None):
+    """Restringe el cubo a un mes y/o a un conjunto de severidades o fuentes"""
+    mascara = pd.Series(True, index=cubo.index)
+    if año is not None and 'año' in cubo.columns:
+        mascara &= (cubo['año'] == año) & (cubo['mes'] == mes)
+    if severidades and 'severidad' in cubo.columns:
+        mascara &= cubo['severidad'].isin(severidades)
+    if fuentes and 'fuente' in cubo.columns:
+        mascara &= cubo['fuente'].isin(fuentes)
+    return cubo[mascara.fillna(False)]
+
+def total_por(cubo, dimension):
+    """Total de errores por valor de una dimensión, de mayor a menor"""
+    totales = cubo.groupby(dimension, observed=True)['n'].sum()
+    return totales[totales > 0].sort_values(ascending=False)
+
+def conteo_por(cubo, dimension):
+    """Total de errores por valor de una dimensión, ordenado por la dimensión"""
+    return cubo.groupby(dimension, observed=True)['n'].sum()
+
+@perfilado
+def kpis(cubo):
+    """Total y conteo por severidad, como en las tarjetas del dashboard"""
+    por_sev = total_por(cubo, 'severidad') if 'severidad' in cubo.columns else pd.Series(dtype=int)
+    return {
+        'total': int(cubo['n'].sum()),
+        'criticos': int(por_sev.get('CRITICA', 0)),
+        'altos': int(por_sev.get('ALTA', 0)),
+        'medios': int(por_sev.get('MEDIA', 0)),
+        'bajos': int(por_sev.get('BAJA', 0)),
+    }
+
+def metricas_resumen(cubo):
+    """Métricas de la pestaña "Resumen": total, tipos distintos, días con errores y promedio por día"""
+    total = int(cubo['n'].sum())
+    dias = int(cubo['dia'].nunique()) if 'dia' in cubo.columns else None
+    return {
+        'total': total,
+        'tipos_unicos': len(total_por(cubo, 'tipo_error')) if 'tipo_error' in cubo.columns else None,
+        'dias_con_errores': dias,
+        'promedio_dia': total // max(dias, 1) if dias is not None else None,
+    }
+
+def resumen_mensual(cubo):
+    """Un renglón por mes con los KPIs y las métricas de la pestaña "Resumen" """
+    filas = []
+    if 'año' not in cubo.columns:
+        return pd.DataFrame(filas)
+    
+    for (año, mes), grupo in cubo.dropna(subset=['año', 'mes']).groupby(['año', 'mes']):
+        fila = {'año': int(año), 'mes': int(mes), 'nombre': f"{MESES_ES.get(int(mes), mes)} {int(año)}"}
+        fila.update(kpis(grupo))
+        metricas = metricas_resumen(grupo)
+        if 'tipo_error' in grupo.columns:
+            tipos = total_por(grupo, 'tipo_error')
+            fila['tipos_unicos'] = metricas['tipos_unicos']
+            fila['tipo_mas_frecuente'] = str(tipos.index[0]) if len(tipos) else None
+        fila['dias_con_errores'] = metricas['dias_con_errores']
+        fila['promedio_dia'] = metricas['promedio_dia']
+        filas.append(fila)
+    
+    return pd.DataFrame(filas)
+
+@perfilado
+def rango_fechas_cubo(cubo):
+    """Primer y último día con errores en el cubo"""
+    if 'año' not in cubo.columns:
+        return None, None
+    dias = cubo[['año', 'mes', 'dia']].dropna().drop_duplicates()
+    if len(dias) == 0:
+        return None, None
+    fechas = pd.to_datetime(dias.rename(columns={'año': 'year', 'mes': 'month', 'dia': 'day'}).astype(int))
+    return fechas.min(), fechas.max()
+
+# ============================================
+# ÍNDICE TEMPORAL
+# ============================================
+def ordenar_por_fecha(df):
+    """Ordena por `fecha` con las fechas inválidas al final (solo si hace falta)"""
+    if 'fecha' not in df.columns:
+        return df
+    
+    validas = df['fecha'].notna().to_numpy()
+    n_validas = int(validas.sum())
+    if validas[:n_validas].all() and df['fecha'].iloc[:n_validas].is_monotonic_increasing:
+        return df
+    
+    return df.sort_values('fecha', kind='stable', na_position='last', ignore_index=True)
+
+class IndiceTemporal:
+    """Offsets de inicio/fin de cada mes sobre un frame ordenado por `fecha`.
+
+    Cada mes se toma como rebanada posicional del frame, sin máscaras ni
+    copias; las filas sin fecha quedan al final, desde `n_validas`.
+    """
+    
+    def __init__(self, fechas):
+        self.n_validas = int(fechas.notna().sum())
+        
+        meses = fechas.to_numpy()[:self.n_validas].astype('datetime64[M]')
+        inicios = np.flatnonzero(np.r_[True, meses[1:] != meses[:-1]]) if self.n_validas else np.array([], dtype=int)
+        fines = np.r_[inicios[1:], self.n_validas].astype(int)
+        self.meses = {}
+        for inicio, fin in zip(inicios, fines):
+            mes = pd.Timestamp(meses[inicio])
+            self.meses[(mes.year, mes.month)] = (int(inicio), int(fin))
+
+class IndiceValores:
+    """Posiciones de fila (ordenadas) de cada valor de una columna.
+
+    Filtrar por un valor es tomar su arreglo de posiciones en lugar de
+    evaluar una máscara booleana sobre todo el frame.
+    """
+    
+    def __init__(self, serie):
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype('category')
+        
+        self.categorias = serie.cat.categories
+        self.codigos = serie.cat.codes.to_numpy()
+        orden = np.argsort(self.codigos, kind='stable')
+        limites = np.searchsorted(self.codigos[orden], np.arange(len(self.categorias) + 1))
+        self.posiciones = {
+            valor: orden[limites[k]:limites[k + 1]]
+            for k, valor in enumerate(self.categorias)
+            if limites[k + 1] > limites[k]
+        }
+    
+    def cuenta(self, valores):
+        """Filas con alguno de los valores, sin tocarlas"""
+        return sum(len(self.posiciones.get(v, ())) for v in valores)
+    
+    def cubre(self, valores):
+        """True si los valores incluyen todos los presentes y no hay nulos (filtrar no quitaría nada)"""
+        return self.cuenta(self.posiciones) == len(self.codigos) and set(self.posiciones) <= set(valores)
+    
+    def filas_de(self, valores):
+        """Posiciones (ordenadas) con alguno de los valores"""
+        listas = [self.posiciones[v] for v in valores if v in self.posiciones]
+        if len(listas) == 1:
+            return listas[0]
+        return np.sort(np.concatenate(listas)) if listas else np.array([], dtype=np.intp)
+    
+    def seleccionar(self, posiciones, valores):
+        """Las `posiciones` cuya fila tiene alguno de los valores.
+
+        Se consulta el código de cada una de esas filas, así que el costo va
+        con `len(posiciones)` y no con el tamaño de la columna.
+        """
+        # La última casilla (siempre False) atiende al código -1 de los nulos
+        admitidos = np.zeros(len(self.categorias) + 1, dtype=bool)
+        ubicacion = self.categorias.get_indexer(list(valores))
+        admitidos[ubicacion[ubicacion >= 0]] = True
+        return posiciones[admitidos[self.codigos[posiciones]]]
+
+# ============================================
+# BÚSQUEDA DE TEXTO
+# ============================================
+PATRON_TOKEN = re.compile(r'\w+')
+
+# Segmentos del índice antes de fusionarlos en uno
+MAX_SEGMENTOS = 8
+
+def tokenizar(mensajes):
+    """Tokens en minúsculas de cada mensaje y la posición del mensaje al que pertenecen"""
+    listas = [PATRON_TOKEN.findall(m.lower()) for m in mensajes]
+    tokens = np.fromiter(itertools.chain.from_iterable(listas), dtype=object, count=sum(map(len, listas)))
+    return tokens, np.repeat(np.arange(len(listas)), [len(t) for t in listas])
+
+def _unicos(valores):
+    """Valores distintos, ordenados (por ordenamiento; np.unique usa hash y es más lento aquí)"""
+    valores = np.sort(valores)
+    return valores[np.r_[True, valores[1:] != valores[:-1]]] if len(valores) else valores
+
+class SegmentoTexto:
+    """Índice invertido de un lote de mensajes distintos.
+
+    El vocabulario va ordenado, así que un token o un prefijo se resuelven
+    con búsqueda binaria; `ids[offsets[k]:offsets[k + 1]]` son los mensajes
+    (posiciones en `mensajes`) que contienen el token k.
+    """
+    
+    def __init__(self, mensajes, tokens, ids):
+        codigos, vocabulario = pd.factorize(tokens, sort=True)
+        pares = _unicos(codigos.astype(np.int64) * len(mensajes) + ids)
+        codigos = pares // len(mensajes)
+        self.mensajes = np.asarray(mensajes, dtype=object)
+        self.vocabulario = np.asarray(vocabulario, dtype=object)
+        self.offsets = np.searchsorted(codigos, np.arange(len(vocabulario) + 1))
+        self.ids = (pares % len(mensajes)).astype(np.int32)
+    
+    @classmethod
+    def de_mensajes(cls, mensajes):
+        return cls(mensajes, *tokenizar(mensajes))
+    
+    @classmethod
+    def fusionar(cls, segmentos):
+        """Un segmento con el contenido de todos, sin volver a tokenizar"""
+        tokens = np.concatenate([np.repeat(s.vocabulario, np.diff(s.offsets)) for s in segmentos])
+        ids, mensajes = pd.factorize(np.concatenate([s.mensajes[s.ids] for s in segmentos]))
+        return cls(mensajes, tokens, ids)
+    
+    def mensajes_con(self, termino, prefijo=False):
+        """Ids de los mensajes que contienen el token (o un token que empieza así)"""
+        inicio = np.searchsorted(self.vocabulario, termino, 'left')
+        fin = np.searchsorted(self.vocabulario, termino + '\U0010ffff' if prefijo else termino, 'right')
+        ids = self.ids[self.offsets[inicio]:self.offsets[fin]]
+        return _unicos(ids) if prefijo else ids
+
+class IndiceTexto:
+    """Índice invertido de tokens de `error_message`; no se modifica una vez creado.
+
+    Cada ingesta agrega un segmento solo con los mensajes nuevos; cuando se
+    juntan `MAX_SEGMENTOS` se fusionan en uno.
+    """
+    
+    def __init__(self, segmentos=()):
+        self.segmentos = tuple(segmentos)
+    
+    def agregar(self, serie):
+        """Índice con los mensajes de `serie` sumados"""
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            mensajes = serie.cat.remove_unused_categories().cat.categories
+        else:
+            mensajes = serie.dropna().unique()
+        if len(mensajes) == 0:
+            return self
+        
+        segmentos = self.segmentos + (SegmentoTexto.de_mensajes(np.asarray(mensajes, dtype=object)),)
+        if len(segmentos) > MAX_SEGMENTOS:
+            segmentos = (SegmentoTexto.fusionar(segmentos),)
+        return IndiceTexto(segmentos)
+    
+    @staticmethod
+    def terminos(consulta):
+        """(token, es_prefijo) de la consulta; `tok*` busca por prefijo"""
+        terminos = []
+        for palabra in consulta.lower().split():
+            tokens = PATRON_TOKEN.findall(palabra)
+            terminos += [(t, False) for t in tokens[:-1]]
+            if tokens:
+                terminos.append((tokens[-1], palabra.endswith('*')))
+        return terminos
+    
+    def buscar(self, consulta):
+        """Mensajes que contienen todos los términos de la consulta (None si no hay términos)"""
+        terminos = self.terminos(consulta)
+        if not terminos:
+            return None
+        
+        encontrados = []
+        for segmento in self.segmentos:
+            ids = None
+            for termino, prefijo in terminos:
+                con = segmento.mensajes_con(termino, prefijo)
+                ids = con if ids is None else np.intersect1d(ids, con, assume_unique=True)
+                if len(ids) == 0:
+                    break
+            encontrados.append(segmento.mensajes[ids])
+        return np.concatenate(encontrados) if encontrados else np.array([], dtype=object)
+
+def indexar_mensajes(indice, df):
+    """`indice` con los mensajes de las filas `df`, si tienen `error_message`"""
+    return indice.agregar(df['error_message']) if 'error_message' in df.columns else indice
+
+def conteo_diario(df, posiciones):
+    """Filas por día entre las `posiciones` dadas"""
+    dias = df['fecha'].to_numpy()[posiciones].astype('datetime64[D]')
+    dias, n = np.unique(dias[~np.isnat(dias)], return_counts=True)
+    return pd.Series(n, index=pd.DatetimeIndex(dias, name='dia'), name='n')
+
+# ============================================
+# ALMACÉN PARTICIONADO POR MES
+# ============================================
+# Partes leídas de disco que se conservan en memoria (compartidas entre sesiones)
+MAX_PARTES_EN_MEMORIA = 24
+
+def huella_filas(df):
+    """Suma (mod 2**64) del hash de cada fila: no depende del orden de las filas
+    ni de cómo se repartan en partes, así que la de un mes es la suma de las
+    de sus partes"""
+    return int(pd.util.hash_pandas_object(df, index=False).to_numpy().sum(dtype=np.uint64))
+
+class Parte:
+    """Bloque de filas de un mes: un DataFrame en memoria o la ruta de un Parquet"""
+    
+    __slots__ = ('ref', 'filas', 'columnas', 'resumenes', 'fuente', 'huella')
+    
+    def __init__(self, ref, filas, columnas, resumenes=None, fuente=None, huella=0):
+        self.ref = ref
+        self.filas = filas
+        self.columnas = columnas
+        self.resumenes = resumenes or {}  # {severidad: ResumenFrecuentes}
+        self.fuente = fuente  # nombre de la fuente, al unir varias
+        self.huella = huella  # `huella_filas` de su contenido
+    
+    @property
+    def en_disco(self):
+        return isinstance(self.ref, str)
+
+_partes_leidas = collections.OrderedDict()
+_lock_partes = threading.Lock()
+
+def leer_parte(parte):
+    """Filas de una parte; las que están en disco quedan en un LRU para los siguientes reruns"""
+    if parte.en_disco:
+        with _lock_partes:
+            df = _partes_leidas.get(parte.ref)
+            if df is not None:
+                _partes_leidas.move_to_end(parte.ref)
+        if df is None:
+            df = pd.read_parquet(parte.ref)
+            with _lock_partes:
+                _partes_leidas[parte.ref] = df
+                while len(_partes_leidas) > MAX_PARTES_EN_MEMORIA:
+                    _partes_leidas.popitem(last=False)
+    else:
+        df = parte.ref
+    
+    if parte.fuente is not None:
+        codigos = np.zeros(len(df), dtype=np.int8)
+        df = df.assign(fuente=pd.Categorical.from_codes(codigos, categories=[parte.fuente]))
+    return df
+
+class AlmacenMensual:
+    """Filas de una fuente particionadas por (año, mes).
+
+    Los meses cerrados no se reescriben: las filas atrasadas que les llegan
+    se agregan como partes adicionales. Solo el mes abierto (el más reciente)
+    se rehace en una parte única. Con `directorio` cada parte es un Parquet
+    en `año=AAAA/mes=MM/`; sin él se quedan en memoria.
+    """
+    
+    def __init__(self, directorio=None):
+        self.directorio = directorio
+    
+    def _parte(self, df, clave, huella=None):
+        """Guarda `df` como parte nueva del mes `clave`; nunca sobrescribe una existente.
+
+        `huella` evita volver a hashear filas ya hasheadas en otras partes.
+        """
+        # Cada parte lleva solo el diccionario de los valores que contiene
+        df = df.reset_index(drop=True)
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].cat.remove_unused_categories()
+        resumenes = resumenes_por_severidad(df)
+        huella = huella_filas(df) if huella is None else huella
+        if self.directorio is None:
+            return Parte(df, len(df), tuple(df.columns), resumenes, huella=huella)
+        
+        if clave is None:
+            carpeta = os.path.join(self.directorio, 'sin_fecha')
+        else:
+            carpeta = os.path.join(self.directorio, f'año={clave[0]}', f'mes={clave[1]:02d}')
+        os.makedirs(carpeta, exist_ok=True)
+        ruta = os.path.join(carpeta, f'{uuid.uuid4().hex[:16]}.parquet')
+        df.to_parquet(ruta + '.tmp', index=False)
+        os.replace(ruta + '.tmp', ruta)
+        return Parte(ruta, len(df), tuple(df.columns), resumenes, huella=huella)
+    
+    def agregar(self, particiones, nuevos):
+        """Particiones que resultan de sumar las filas `nuevos` (no modifica las recibidas)"""
+        particiones = dict(particiones)
+        abierto = max((clave for clave in particiones if clave is not None), default=None)
+        
+        nuevos = ordenar_por_fecha(nuevos)
+        if 'fecha' in nuevos.columns:
+            indice = IndiceTemporal(nuevos['fecha'])
+            grupos = [(clave, nuevos.iloc[inicio:fin]) for clave, (inicio, fin) in indice.meses.items()]
+            if indice.n_validas < len(nuevos):
+                grupos.append((None, nuevos.iloc[indice.n_validas:]))
+        else:
+            grupos = [(None, nuevos)]
+        
+        for clave, filas in grupos:
+            if clave is not None and clave == abierto:
+                huella = (huella_filas(filas) + sum(parte.huella for parte in particiones[clave])) % 2**64
+                previas = [leer_parte(parte) for parte in particiones[clave]]
+                filas = ordenar_por_fecha(concatenar_bloques(previas + [filas]))
+                particiones[clave] = (self._parte(filas, clave, huella),)
+            else:
+                particiones[clave] = particiones.get(clave, ()) + (self._parte(filas, clave),)
+        return particiones
+
+def rutas_partes(particiones):
+    """Rutas de los Parquet de un juego de particiones"""
+    return {parte.ref for partes in particiones.values() for parte in partes if parte.en_disco}
+
+# ============================================
+# SERIES DE TIEMPO
+# ============================================
+# Etiqueta de cada resolución (alias de pandas) para títulos y ejes
+RESOLUCIONES = {'h': 'hora', 'D': 'día'}
+
+# Puntos máximos por traza; series más largas se reducen con LTTB
+MAX_PUNTOS_SERIE = 1500
+
+# Lapsos de hasta tantos días se muestran por hora; más largos, por día
+DIAS_POR_HORA = 90
+
+def horas_cubo(cubo):
+    """Filas del cubo con fecha y la hora (datetime64) que representa cada una"""
+    con_fecha = cubo.dropna(subset=['año', 'mes', 'dia', 'hora'])
+    partes = con_fecha[['año', 'mes', 'dia', 'hora']].astype(int)
+    fechas = pd.to_datetime(partes.rename(columns={'año': 'year', 'mes': 'month', 'dia': 'day', 'hora': 'hour'}))
+    return con_fecha, fechas.to_numpy()
+
+def serie_horaria(cubo):
+    """Errores por hora (índice) y severidad (columnas), derivada del cubo"""
+    if 'año' not in cubo.columns:
+        return pd.DataFrame()
+    
+    con_fecha, fechas = horas_cubo(cubo)
+    if 'severidad' in con_fecha.columns:
+        severidad = con_fecha['severidad'].astype(object).fillna('(sin severidad)').to_numpy()
+    else:
+        severidad = '(todas)'
+    
+    tabla = pd.DataFrame({'fecha': fechas, 'severidad': severidad, 'n': con_fecha['n'].to_numpy()})
+    return tabla.pivot_table(index='fecha', columns='severidad', values='n', aggfunc='sum', fill_value=0).sort_index()
+
+def elegir_resolucion(desde, hasta):
+    """Hora o día según el lapso a mostrar; LTTB se encarga de que no sobren puntos.
+
+    No se agrupa por semana: un pico de un día quedaría diluido en el total
+    semanal, y LTTB lo conserva.
+    """
+    dias = (hasta - desde) / pd.Timedelta(days=1)
+    return 'h' if dias <= DIAS_POR_HORA else 'D'
+
+def lttb(y, umbral):
+    """Índices que conserva Largest-Triangle-Three-Buckets sobre una serie equiespaciada.
+
+    Mantiene el primer y el último punto y, de cada cubeta intermedia, el
+    que forma el triángulo más grande con el punto anterior elegido y el
+    promedio de la cubeta siguiente; así se preservan picos y valles.
+    """
+    n = len(y)
+    if umbral >= n or umbral < 3:
+        return np.arange(n)
+    
+    y = np.asarray(y, dtype=float)
+    x = np.arange(n, dtype=float)
+    limites = np.floor(np.linspace(1, n - 1, umbral - 1)).astype(int)
+    elegidos = np.empty(umbral, dtype=int)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    
+    a = 0
+    for i in range(umbral - 2):
+        inicio, fin = limites[i], max(limites[i + 1], limites[i] + 1)
+        sig_fin = limites[i + 2] if i + 2 < len(limites) else n
+        sig_x = x[fin:sig_fin].mean() if sig_fin > fin else x[-1]
+        sig_y = y[fin:sig_fin].mean() if sig_fin > fin else y[-1]
+        
+        areas = np.abs((x[a] - sig_x) * (y[inicio:fin] - y[a]) - (x[a] - x[inicio:fin]) * (sig_y - y[a]))
+        a = inicio + int(np.argmax(areas))
+        elegidos[i + 1] = a
+    
+    return elegidos
+
+def serie_temporal(horaria, severidades=None, desde=None, hasta=None, max_puntos=MAX_PUNTOS_SERIE):
+    """Serie de errores del rango, a la resolución que le corresponde y reducida con LTTB.
+
+    Devuelve (serie, resolución); los periodos sin errores quedan en cero.
+    """
+    if horaria.empty:
+        return pd.Series(dtype='int64'), None
+    
+    columnas = [c for c in horaria.columns if not severidades or c in severidades]
+    serie = horaria[columnas].sum(axis=1).loc[desde:hasta]
+    if len(serie) == 0:
+        return serie, None
+    
+    resolucion = elegir_resolucion(serie.index[0], serie.index[-1])
+    serie = serie.resample(resolucion).sum()
+    if len(serie) > max_puntos:
+        serie = serie.iloc[lttb(serie.to_numpy(), max_puntos)]
+    return serie, resolucion
+
+# ============================================
+# DETECCIÓN DE ANOMALÍAS
+# ============================================
+# Peso de cada hora nueva en su línea base (memoria de ~1/ALFA días por franja)
+ALFA_EWMA = 0.1
+
+# Desviaciones sobre la línea base y errores mínimos en la hora para marcar un pico
+UMBRAL_Z = 4.0
+MIN_ERRORES_PICO = 10
+
+# Horas observadas de una franja antes de marcar picos en ella, y picos que se guardan
+MIN_OBSERVACIONES = 7
+MAX_ANOMALIAS = 5000
+
+# Horas con fecha más allá de ahora más esto (fechas mal capturadas) no cuentan como datos recientes
+TOLERANCIA_FUTURO = np.timedelta64(24, 'h')
+
+COLUMNAS_ANOMALIAS = ['hora', 'tipo_error', 'n', 'esperado', 'z', 'en_curso']
+
+_UNA_HORA = np.timedelta64(1, 'h')
+
+def limite_futuro():
+    """Última hora (datetime64[h], en `ZONA_HORARIA`) que se acepta como dato real"""
+    ahora = pd.Timestamp.now(ZONA_HORARIA).tz_localize(None).to_datetime64()
+    return ahora.astype('datetime64[h]') + TOLERANCIA_FUTURO
+
+class DetectorAnomalias:
+    """Líneas base EWMA (media y varianza) de errores por hora para cada
+    (tipo_error, hora del día), alimentadas solo con las filas nuevas.
+
+    Una hora se evalúa al cerrarse, cuando llegan datos de una hora
+    posterior: se compara contra su línea base y después la actualiza. Las
+    horas sin datos solo decaen las bases (conteo cero), de una vez por
+    hueco. La hora en curso se evalúa sin actualizar, para avisar mientras
+    ocurre el pico. Las filas atrasadas de horas ya cerradas no modifican las
+    bases, y las de fechas futuras (más allá de `limite_futuro`) se ignoran.
+    """
+    
+    def __init__(self, alfa=ALFA_EWMA, umbral=UMBRAL_Z):
+        self.alfa = alfa
+        self.umbral = umbral
+        self.tipos = {}  # tipo_error -> columna de las matrices
+        self.media = np.zeros((24, 0))
+        self.varianza = np.zeros((24, 0))
+        self.observaciones = np.zeros(24, dtype=int)
+        self.cerrada = None  # última hora cerrada (datetime64[h])
+        self.abierta = None  # hora en curso: la última con datos
+        self.pendientes = np.zeros(0)  # conteos de `abierta` por tipo
+        self.anomalias = []
+    
+    def copia(self):
+        """Copia independiente, para alimentarla sin tocar la publicada"""
+        otro = DetectorAnomalias(self.alfa, self.umbral)
+        otro.tipos = dict(self.tipos)
+        otro.media = self.media.copy()
+        otro.varianza = self.varianza.copy()
+        otro.observaciones = self.observaciones.copy()
+        otro.cerrada = self.cerrada
+        otro.abierta = self.abierta
+        otro.pendientes = self.pendientes.copy()
+        otro.anomalias = list(self.anomalias)
+        return otro
+    
+    def alimentar(self, cubo):
+        """Incorpora el cubo de las filas recién ingeridas; el costo depende solo de lo nuevo"""
+        if 'tipo_error' not in cubo.columns or 'año' not in cubo.columns:
+            return
+        
+        con_fecha, fechas = horas_cubo(cubo)
+        horas = fechas.astype('datetime64[h]')
+        vigentes = horas <= limite_futuro()
+        if not vigentes.all():
+            logger.warning("%d errores con fecha futura no alimentan la detección de picos",
+                           con_fecha['n'].to_numpy()[~vigentes].sum())
+        if self.abierta is not None:
+            vigentes &= horas >= self.abierta
+        if not vigentes.any():
+            return
+        
+        tipos = con_fecha['tipo_error'].astype(object).fillna('(sin tipo)').to_numpy()[vigentes]
+        for tipo in pd.unique(tipos):
+            if tipo not in self.tipos:
+                self.tipos[tipo] = len(self.tipos)
+        columnas = np.array([self.tipos[t] for t in tipos], dtype=int)
+        
+        # Solo las horas con datos; la en curso entra con lo que ya tenía
+        unicas, fila = np.unique(horas[vigentes], return_inverse=True)
+        conteos = np.zeros((len(unicas), len(self.tipos)))
+        np.add.at(conteos, (fila, columnas), con_fecha['n'].to_numpy()[vigentes])
+        if self.abierta is not None and unicas[0] == self.abierta:
+            conteos[0, :len(self.pendientes)] += self.pendientes
+        elif self.abierta is not None:
+            previa = np.zeros((1, len(self.tipos)))
+            previa[0, :len(self.pendientes)] = self.pendientes
+            unicas = np.concatenate([[self.abierta], unicas])
+            conteos = np.vstack([previa, conteos])
+        
+        faltantes = len(self.tipos) - self.media.shape[1]
+        self.media = np.pad(self.media, ((0, 0), (0, faltantes)))
+        self.varianza = np.pad(self.varianza, ((0, 0), (0, faltantes)))
+        
+        # Todas las horas anteriores a la última con datos quedan cerradas
+        for hora, fila in zip(unicas[:-1], conteos[:-1]):
+            self._decaer_hasta(hora)
+            self._cerrar(hora, fila)
+        self.abierta = unicas[-1]
+        self.pendientes = conteos[-1]
+        del self.anomalias[:-MAX_ANOMALIAS]
+    
+    def _decaer_hasta(self, hora):
+        """Aplica a las bases las horas vacías entre la última cerrada y `hora`.
+
+        Con conteo cero, k pasos del EWMA dejan media·b^k y
+        b^k·(varianza + media²·(1 - b^k)), con b = 1 - alfa; cada franja
+        recibe su k de una vez, sin recorrer el hueco hora por hora.
+        """
+        if self.cerrada is None:
+            return
+        vacias = int((hora - self.cerrada) // _UNA_HORA) - 1
+        if vacias <= 0:
+            return
+        
+        primera = int((self.cerrada + 1).astype(int) % 24)
+        pasos = np.full(24, vacias // 24)
+        pasos[(primera + np.arange(vacias % 24)) % 24] += 1
+        factor = ((1 - self.alfa) ** pasos)[:, None]
+        self.varianza = factor * (self.varianza + self.media ** 2 * (1 - factor))
+        self.media = self.media * factor
+        self.observaciones += pasos
+    
+    def _evaluar(self, hora, conteos, en_curso):
+        """Registros de los tipos cuya hora supera su línea base"""
+        franja = int(hora.astype(int) % 24)
+        if self.observaciones[franja] < MIN_OBSERVACIONES or conteos.max(initial=0) < MIN_ERRORES_PICO:
+            return []
+        
+        media = self.media[franja, :len(conteos)]
+        desviacion = np.sqrt(np.maximum(self.varianza[franja, :len(conteos)], np.maximum(media, 1)))
+        z = (conteos - media) / desviacion
+        nombres = list(self.tipos)
+        return [
+            {'hora': pd.Timestamp(hora), 'tipo_error': nombres[c], 'n': int(conteos[c]),
+             'esperado': round(float(media[c]), 1), 'z': round(float(z[c]), 1), 'en_curso': en_curso}
+            for c in np.flatnonzero((z > self.umbral) & (conteos >= MIN_ERRORES_PICO))
+        ]
+    
+    def _cerrar(self, hora, conteos):
+        self.anomalias.extend(self._evaluar(hora, conteos, en_curso=False))
+        
+        franja = int(hora.astype(int) % 24)
+        diferencia = conteos - self.media[franja]
+        incremento = self.alfa * diferencia
+        self.media[franja] += incremento
+        self.varianza[franja] = (1 - self.alfa) * (self.varianza[franja] + diferencia * incremento)
+        self.observaciones[franja] += 1
+        self.cerrada = hora
+    
+    def tabla(self):
+        """Picos detectados, incluida la hora en curso si ya supera su línea base"""
+        registros = list(self.anomalias)
+        if self.abierta is not None:
+            registros += self._evaluar(self.abierta, self.pendientes, en_curso=True)
+        return pd.DataFrame(registros, columns=COLUMNAS_ANOMALIAS)
+
+# ============================================
+# CARGAR DATOS (INGESTA INCREMENTAL)
+# ============================================
+# Períodos ya leídos que guarda cada instantánea, y filtros sobre ellos
+MAX_PERIODOS = 8
+MAX_FILTRADOS = 64
+
+# Dimensiones con índice de valores en cada período; 'hora' (del día) sale de `fecha`
+DIMENSIONES_FILTRO = ('severidad', 'fuente', 'tipo_error', 'hora', 'plantilla')
+
+class Periodo:
+    """Filas de un período ya leídas de sus particiones, ordenadas por `fecha`.
+
+    `df` es el frame completo del período, de solo lectura y compartido por
+    todas las sesiones; los filtros solo cambian `posiciones`, las filas
+    (ordenadas) que los cumplen.
+    """
+    
+    def __init__(self, df, indice_texto=None):
+        self.df = df
+        self.indice_texto = indice_texto
+        self.posiciones = np.arange(len(df))
+        self._indices_valores = {}
+        self._busqueda = (None, None)
+    
+    @property
+    def filas(self):
+        return len(self.posiciones)
+    
+    def tiene(self, dimension):
+        return ('fecha' if dimension == 'hora' else dimension) in self.df.columns
+    
+    def indexar(self, dimensiones=DIMENSIONES_FILTRO):
+        """Construye de una vez los índices de valores de las dimensiones de filtro"""
+        for dimension in dimensiones:
+            if self.tiene(dimension):
+                self.indice_valores(dimension)
+        return self
+    
+    def filtrar(self, filtros):
+        """El mismo período con solo las filas que cumplen todos los `filtros`, sin copiar filas.
+
+        `filtros` es {dimensión: valores}. Las posiciones salen de la lista
+        del índice de la dimensión más selectiva; las demás solo se comprueban
+        sobre esas filas, así que el costo va con el tamaño del resultado.
+        """
+        filtrado = copy.copy(self)  # comparte df e índices
+        filtrado.__dict__.pop('cubo', None)
+        activos = {}
+        for dimension, valores in filtros.items():
+            if valores and self.tiene(dimension):
+                indice = self.indice_valores(dimension)
+                if not indice.cubre(valores):
+                    activos[dimension] = (indice, valores)
+        if not activos:
+            return filtrado
+        
+        primera = min(activos, key=lambda d: activos[d][0].cuenta(activos[d][1]))
+        indice, valores = activos.pop(primera)
+        posiciones = indice.filas_de(valores)
+        for indice, valores in activos.values():
+            posiciones = indice.seleccionar(posiciones, valores)
+        if len(self.posiciones) < len(self.df):
+            posiciones = np.intersect1d(self.posiciones, posiciones, assume_unique=True)
+        filtrado.posiciones = posiciones
+        return filtrado
+    
+    @functools.cached_property
+    def cubo(self):
+        """Cubo de solo las filas del período filtrado (para filtros que el cubo global no tiene)"""
+        return construir_cubo(self.df.take(self.posiciones))
+    
+    def indice_valores(self, dimension):
+        """Índice de valores de `dimension` ('hora' sale de `fecha`), construido la primera vez que se pide"""
+        if dimension not in self._indices_valores:
+            if dimension == 'hora':
+                serie = self.df['fecha'].dt.hour.astype('Int8')
+            else:
+                serie = self.df[dimension]
+            self._indices_valores[dimension] = IndiceValores(serie)
+        return self._indices_valores[dimension]
+    
+    def buscar(self, consulta):
+        """Posiciones (ordenadas) de las filas cuyo mensaje cumple la consulta; None si no filtra.
+
+        El índice da los mensajes que coinciden; las filas salen de sus
+        códigos categóricos, sin recorrer el texto.
+        """
+        previa, posiciones = self._busqueda
+        if consulta == previa:
+            return posiciones
+        
+        mensajes = self.indice_texto.buscar(consulta) if self.indice_texto is not None else None
+        if mensajes is None or 'error_message' not in self.df.columns:
+            posiciones = None
+        else:
+            serie = self.df['error_message']
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                # La última casilla (siempre False) atiende al código -1 de los nulos
+                coinciden = np.zeros(len(serie.cat.categories) + 1, dtype=bool)
+                ubicacion = serie.cat.categories.get_indexer(mensajes)
+                coinciden[ubicacion[ubicacion >= 0]] = True
+                posiciones = np.flatnonzero(coinciden[serie.cat.codes.to_numpy()])
+            else:
+                posiciones = np.flatnonzero(serie.isin(mensajes).to_numpy())
+        self._busqueda = (consulta, posiciones)
+        return posiciones
+
+class Instantanea:
+    """Filas ingeridas, particionadas por mes, y sus agregados; no se modifica una vez creada.
+
+    Las filas de un período se leen bajo demanda (`periodo`) solo de las
+    particiones que le tocan; KPIs y gráficos salen del cubo.
+    """
+    
+    def __init__(self, particiones, cubo, version='', anomalias=None, indice_texto=None, catalogo=None):
+        self.particiones = particiones  # {(año, mes) o None si no hay fecha: (Parte, ...)}
+        self.cubo = cubo
+        self.catalogo = catalogo if catalogo is not None else catalogo_meses(cubo)  # errores y críticos por mes
+        self.version = version  # huella del contenido de la fuente
+        self.anomalias = anomalias if anomalias is not None else pd.DataFrame(columns=COLUMNAS_ANOMALIAS)
+        self.indice_texto = indice_texto if indice_texto is not None else IndiceTexto()
+        self._series = {}
+        self._periodos = collections.OrderedDict()
+        self._filtrados = collections.OrderedDict()
+        self._cargas = {}
+        self._huellas = {}
+        self._ultimas_horas = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def filas(self):
+        return sum(parte.filas for partes in self.particiones.values() for parte in partes)
+    
+    def meses(self):
+        """(año, mes) con datos, del más reciente al más antiguo, según las particiones"""
+        return sorted((clave for clave in self.particiones if clave is not None), reverse=True)
+    
+    def meses_cerrados(self):
+        """Meses anteriores al más reciente: ya no cambian salvo por filas atrasadas"""
+        return self.meses()[1:]
+    
+    def huella_mes(self, año, mes):
+        """Huella del contenido de un mes (filas de cada fuente y sus picos).
+
+        Solo cambia si llegan filas a ese mes, no con cada refresco.
+        """
+        if (año, mes) not in self._huellas:
+            sumas = collections.Counter()
+            filas = collections.Counter()
+            for parte in self._partes(año, mes):
+                sumas[parte.fuente or ''] = (sumas[parte.fuente or ''] + parte.huella) % 2**64
+                filas[parte.fuente or ''] += parte.filas
+            huella = hashlib.blake2b(digest_size=8)
+            huella.update(repr(sorted((f, filas[f], sumas[f]) for f in filas)).encode())
+            anomalias = self.anomalias_periodo(año, mes)
+            huella.update(pd.util.hash_pandas_object(anomalias, index=False).to_numpy().tobytes())
+            self._huellas[(año, mes)] = huella.hexdigest()
+        return self._huellas[(año, mes)]
+    
+    def fuentes(self):
+        """Nombres de las fuentes unidas en la instantánea"""
+        return sorted({parte.fuente for partes in self.particiones.values() for parte in partes} - {None})
+    
+    def _partes(self, año=None, mes=None, fuentes=None):
+        """Partes de un mes (o de todo el histórico, en orden), de las fuentes dadas"""
+        if año is None:
+            meses = sorted(self.particiones, key=lambda c: (c is None, c or (0, 0)))
+        else:
+            meses = [(año, mes)] if (año, mes) in self.particiones else []
+        return [parte for m in meses for parte in self.particiones[m] if not fuentes or parte.fuente in fuentes]
+    
+    def _compartido(self, cache, clave, construir, maximo):
+        """`construir()` guardado en `cache` (LRU); si varias sesiones piden la
+        misma clave a la vez, una construye y las demás esperan el resultado"""
+        with self._lock:
+            if clave in cache:
+                cache.move_to_end(clave)
+                return cache[clave]
+            carga = self._cargas.setdefault((id(cache), clave), threading.Lock())
+        
+        with carga:
+            with self._lock:
+                if clave in cache:
+                    return cache[clave]
+            valor = construir()
+            with self._lock:
+                cache[clave] = valor
+                while len(cache) > maximo:
+                    cache.popitem(last=False)
+                self._cargas.pop((id(cache), clave), None)
+        return valor
+    
+    def _leer_periodo(self, año, mes):
+        bloques = [leer_parte(parte) for parte in self._partes(año, mes)]
+        if len(bloques) == 1:
+            df = bloques[0]
+        else:
+            df = ordenar_por_fecha(concatenar_bloques(bloques))
+        return Periodo(df, self.indice_texto).indexar()
+    
+    def periodo(self, año=None, mes=None, severidades=None, fuentes=None, filtros=None):
+        """Un mes (o todo el histórico), leyendo solo sus particiones.
+
+        El frame del período y sus índices de valores se construyen una vez
+        y los comparten todas las sesiones; severidades, fuentes y los
+        `filtros` de drill-down ({dimensión: valores}) solo eligen posiciones.
+        """
+        base = self._compartido(self._periodos, (año, mes), lambda: self._leer_periodo(año, mes), MAX_PERIODOS)
+        filtros = {'severidad': severidades, 'fuente': fuentes, **(filtros or {})}
+        filtros = {dimension: valores for dimension, valores in filtros.items() if valores}
+        if not filtros:
+            return base
+        clave = (año, mes) + tuple(sorted((d, tuple(sorted(v))) for d, v in filtros.items()))
+        return self._compartido(self._filtrados, clave, lambda: base.filtrar(filtros), MAX_FILTRADOS)
+    
+    @functools.cached_property
+    def horaria(self):
+        """Serie horaria por severidad, calculada una vez por instantánea"""
+        return serie_horaria(self.cubo)
+    
+    def serie_temporal(self, severidades=None, desde=None, hasta=None, fuentes=None):
+        """`serie_temporal` del rango, guardada por (severidades, fuentes, rango)"""
+        clave = (tuple(sorted(severidades or ())), tuple(sorted(fuentes or ())), desde, hasta)
+        if clave not in self._series:
+            horaria = serie_horaria(filtrar_cubo(self.cubo, fuentes=fuentes)) if fuentes else self.horaria
+            self._series[clave] = serie_temporal(horaria, severidades, desde, hasta)
+        return self._series[clave]
+    
+    def mas_frecuentes(self, n, año=None, mes=None, severidades=None, fuentes=None, filtros=None):
+        """Los `n` valores de `COLUMNA_TOP` más frecuentes del período y la cota de error.
+
+        Hasta `UMBRAL_TOP_EXACTO` filas, o con `filtros` de drill-down, se
+        cuentan exactos (error 0) sobre las filas que quedan; si no, se
+        combinan los resúmenes guardados en cada parte.
+        """
+        partes = self._partes(año, mes, fuentes)
+        if any((filtros or {}).values()) or sum(parte.filas for parte in partes) <= UMBRAL_TOP_EXACTO:
+            periodo = self.periodo(año, mes, severidades, fuentes, filtros)
+            if COLUMNA_TOP not in periodo.df.columns:
+                return pd.Series(dtype='int64'), 0
+            return contar_top(periodo.df[COLUMNA_TOP].take(periodo.posiciones), n), 0
+        
+        resumen = ResumenFrecuentes.combinar(
+            resumen
+            for parte in partes
+            for severidad, resumen in parte.resumenes.items()
+            if not severidades or severidad in severidades
+        )
+        return resumen.top(n), resumen.error
+    
+    def _anomalias_de(self, fuentes):
+        if fuentes and 'fuente' in self.anomalias.columns:
+            return self.anomalias[self.anomalias['fuente'].isin(fuentes)]
+        return self.anomalias
+    
+    def anomalias_periodo(self, año=None, mes=None, fuentes=None):
+        """Picos detectados dentro de un mes (o todos), opcionalmente de algunas fuentes"""
+        anomalias = self._anomalias_de(fuentes)
+        if año is None or len(anomalias) == 0:
+            return anomalias
+        hora = anomalias['hora']
+        return anomalias[(hora.dt.year == año) & (hora.dt.month == mes)]
+    
+    def ultima_hora(self, fuentes=None):
+        """Hora más reciente con datos (de algunas fuentes), o None"""
+        clave = tuple(sorted(fuentes or ()))
+        if clave not in self._ultimas_horas:
+            cubo = filtrar_cubo(self.cubo, fuentes=fuentes) if fuentes else self.cubo
+            _, fechas = horas_cubo(cubo) if 'hora' in cubo.columns else (None, np.array([], 'datetime64[h]'))
+            fechas = fechas[fechas <= limite_futuro()]
+            self._ultimas_horas[clave] = pd.Timestamp(fechas.max()) if len(fechas) else None
+        return self._ultimas_horas[clave]
+    
+    def anomalias_recientes(self, horas=24, fuentes=None):
+        """Picos de las últimas `horas` hasta la hora más reciente con datos, para la alerta"""
+        anomalias = self._anomalias_de(fuentes)
+        ultima = self.ultima_hora(fuentes)
+        if len(anomalias) == 0 or ultima is None:
+            return anomalias.iloc[:0]
+        return anomalias[anomalias['hora'] > ultima - pd.Timedelta(hours=horas)]
+
+class EstadoIngesta:
+    """Estado de la ingesta incremental: el log solo crece al final, así que
+    en cada refresco se parsea únicamente la cola nueva del CSV.
+
+    La exportación de Google no admite descargas parciales, por lo que el
+    archivo se sigue descargando completo; lo que se evita es el parseo. Si
+    el prefijo ya ingerido cambió (filas editadas o borradas) se hace una
+    recarga completa.
+
+    Las filas van a un `AlmacenMensual`. Con `ruta` sus particiones se
+    guardan en esa carpeta, junto con el cubo y el estado de ingesta, y
+    `restaurar()` las recupera al arrancar; con el validador guardado, el
+    primer refresco tras reiniciar no vuelve a parsear si la fuente no cambió.
+    """
+    
+    def __init__(self, fuente, ruta=None):
+        self.fuente = fuente
+        self.ruta = ruta
+        self.almacen = AlmacenMensual(ruta)
+        self.instantanea = None
+        self.columnas = None
+        self.bytes_ingeridos = 0
+        self.firma = None
+        self.validador = None
+        self.detector = DetectorAnomalias()
+        self.calidad_fechas = CalidadFechas()
+        self.ultima_carga = 0.0
+        self.lock = threading.Lock()
+        self._por_borrar = set()
+    
+    def actualizar(self):
+        """Ingiere lo nuevo y publica la instantánea resultante de una sola vez.
+
+        El estado solo se modifica al final, así que si la descarga o el
+        parseo fallan se conserva la última instantánea buena.
+        """
+        with self.lock:
+            contenido, validador = self.fuente.leer_condicional(self.validador if self.instantanea else None)
+            if contenido is None:
+                self.ultima_carga = time.time()
+                return
+            vista = memoryview(contenido)
+            
+            hash_prefijo = hashlib.blake2b(vista[:self.bytes_ingeridos])
+            previa = self.instantanea
+            es_anexo = (
+                previa is not None
+                and len(contenido) >= self.bytes_ingeridos
+                and hash_prefijo.hexdigest() == self.firma
+            )
+            
+            columnas = self.columnas
+            instantanea = previa
+            detector = self.detector
+            calidad = copy.deepcopy(self.calidad_fechas)
+            if es_anexo:
+                cola = contenido[self.bytes_ingeridos:]
+                hash_prefijo.update(vista[self.bytes_ingeridos:])
+                firma = hash_prefijo.hexdigest()
+                if cola.strip():
+                    nuevos = parsear_csv(cola, nombres=columnas, calidad=calidad)
+                    cubo_nuevos = construir_cubo(nuevos)
+                    detector = detector.copia()
+                    detector.alimentar(cubo_nuevos)
+                    instantanea = Instantanea(
+                        self.almacen.agregar(previa.particiones, nuevos),
+                        combinar_cubos(previa.cubo, cubo_nuevos),
+                        version=firma[:16],
+                        anomalias=detector.tabla(),
+                        indice_texto=indexar_mensajes(previa.indice_texto, nuevos),
+                        catalogo=combinar_catalogos(previa.catalogo, catalogo_meses(cubo_nuevos)),
+                    )
+            else:
+                firma = hashlib.blake2b(vista).hexdigest()
+                columnas = leer_encabezado(contenido)
+                calidad = CalidadFechas()
+                df = parsear_csv(contenido, calidad=calidad)
+                cubo = construir_cubo(df)
+                detector = DetectorAnomalias()
+                detector.alimentar(cubo)
+                instantanea = Instantanea(
+                    self.almacen.agregar({}, df), cubo, version=firma[:16], anomalias=detector.tabla(),
+                    indice_texto=indexar_mensajes(IndiceTexto(), df),
+                )
+            
+            if calidad.total_fallidas > (self.calidad_fechas.total_fallidas if es_anexo else 0):
+                logger.warning("%s: %s", self.fuente.identidad(), calidad.resumen())
+            
+            self.columnas = columnas
+            self.firma = firma
+            self.validador = validador
+            self.detector = detector
+            self.calidad_fechas = calidad
+            self.bytes_ingeridos = len(contenido)
+            self.instantanea = instantanea
+            self.ultima_carga = time.time()
+            
+            if instantanea is not previa:
+                if self.ruta:
+                    try:
+                        self.guardar()
+                    except Exception:
+                        logger.exception("No se pudo guardar la instantánea en %s", self.ruta)
+                if previa is not None:
+                    self._retirar(previa)
+    
+    def _retirar(self, previa):
+        """Borra las partes reemplazadas en la publicación anterior.
+
+        Las que reemplaza esta publicación se borran en la siguiente, para
+        que las sesiones que todavía leen `previa` no se queden sin archivo.
+        """
+        for ruta in self._por_borrar:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(ruta)
+        self._por_borrar = rutas_partes(previa.particiones) - rutas_partes(self.instantanea.particiones)
+    
+    def _archivo_cubo(self, version):
+        return f'{self.ruta}.{version}.cubo.parquet'
+    
+    def guardar(self):
+        """Escribe el cubo y el estado con el manifiesto de particiones; el estado
+        se reemplaza al final, así que un corte a medias deja el anterior intacto"""
+        instantanea = self.instantanea
+        os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+        ruta_cubo = self._archivo_cubo(instantanea.version)
+        instantanea.cubo.to_parquet(ruta_cubo + '.tmp')
+        os.replace(ruta_cubo + '.tmp', ruta_cubo)
+        
+        estado = {
+            'formato': VERSION_INSTANTANEA,
+            'fuente': self.fuente.identidad(),
+            'version': instantanea.version,
+            'particiones': instantanea.particiones,
+            'indice_texto': instantanea.indice_texto,
+            'columnas': self.columnas,
+            'bytes_ingeridos': self.bytes_ingeridos,
+            'firma': self.firma,
+            'validador': self.validador,
+            'detector': self.detector,
+            'calidad_fechas': self.calidad_fechas,
+            'ultima_carga': self.ultima_carga,
+        }
+        with open(self.ruta + '.estado.tmp', 'wb') as f:
+            pickle.dump(estado, f)
+        os.replace(self.ruta + '.estado.tmp', self.ruta + '.estado.pkl')
+        
+        # Cubos de versiones anteriores
+        carpeta, prefijo = os.path.split(self.ruta)
+        vigente = os.path.basename(ruta_cubo)
+        for nombre in os.listdir(carpeta or '.'):
+            if nombre.startswith(prefijo + '.') and nombre.endswith('.parquet') and nombre != vigente:
+                os.remove(os.path.join(carpeta, nombre))
+    
+    def _limpiar_huerfanas(self, particiones):
+        """Borra las partes en disco que no están en el manifiesto (cortes a medias)"""
+        vigentes = rutas_partes(particiones)
+        for carpeta, _, nombres in os.walk(self.ruta):
+            for nombre in nombres:
+                ruta = os.path.join(carpeta, nombre)
+                if ruta not in vigentes:
+                    os.remove(ruta)
+    
+    def restaurar(self):
+        """Carga la instantánea guardada, si hay una de esta misma fuente; devuelve si lo logró"""
+        try:
+            with open(self.ruta + '.estado.pkl', 'rb') as f:
+                estado = pickle.load(f)
+            if estado['formato'] != VERSION_INSTANTANEA or estado['fuente'] != self.fuente.identidad():
+                return False
+            particiones = estado['particiones']
+            if not all(os.path.exists(ruta) for ruta in rutas_partes(particiones)):
+                return False
+            cubo = pd.read_parquet(self._archivo_cubo(estado['version']))
+        except FileNotFoundError:
+            return False
+        except Exception:
+            logger.exception("Instantánea ilegible en %s; se hará una carga completa", self.ruta)
+            return False
+        
+        self._limpiar_huerfanas(particiones)
+        with self.lock:
+            self.columnas = estado['columnas']
+            self.bytes_ingeridos = estado['bytes_ingeridos']
+            self.firma = estado['firma']
+            self.validador = estado['validador']
+            self.detector = estado['detector']
+            self.calidad_fechas = estado['calidad_fechas']
+            self.ultima_carga = estado['ultima_carga']
+            self.instantanea = Instantanea(
+                particiones, cubo, version=estado['version'], anomalias=self.detector.tabla(),
+                indice_texto=estado['indice_texto'],
+            )
+        return True
+
+def combinar_instantaneas(instantaneas):
+    """Une las instantáneas de varias fuentes en una sola, con la columna `fuente`.
+
+    Las filas no se copian: cada mes junta las partes de todas las fuentes.
+    """
+    tipo = pd.CategoricalDtype(sorted(instantaneas))
+    
+    def etiquetar(tabla, nombre):
+        codigos = np.full(len(tabla), tipo.categories.get_loc(nombre), dtype=np.int8)
+        return tabla.assign(fuente=pd.Categorical.from_codes(codigos, dtype=tipo))
+    
+    partes = [(nombre, inst) for nombre, inst in sorted(instantaneas.items())]
+    particiones = {}
+    for nombre, inst in partes:
+        for mes, lista in inst.particiones.items():
+            etiquetadas = tuple(Parte(p.ref, p.filas, p.columnas, p.resumenes, fuente=nombre, huella=p.huella) for p in lista)
+            particiones[mes] = particiones.get(mes, ()) + etiquetadas
+    cubo = combinar_cubos(*[etiquetar(inst.cubo, nombre) for nombre, inst in partes])
+    anomalias = pd.concat(
+        [etiquetar(inst.anomalias, nombre) for nombre, inst in partes if len(inst.anomalias)]
+        or [etiquetar(pd.DataFrame(columns=COLUMNAS_ANOMALIAS), partes[0][0])],
+        ignore_index=True,
+    )
+    indice_texto = IndiceTexto(segmento for _, inst in partes for segmento in inst.indice_texto.segmentos)
+    version = hashlib.blake2b(''.join(f'{nombre}:{inst.version};' for nombre, inst in partes).encode())
+    catalogo = combinar_catalogos(*[inst.catalogo for _, inst in partes])
+    return Instantanea(
+        particiones, cubo, version=version.hexdigest()[:16], anomalias=anomalias,
+        indice_texto=indice_texto, catalogo=catalogo,
+    )
+
+class IngestaMultiple:
+    """Ingesta incremental de varias fuentes en paralelo, unidas en una instantánea.
+
+    Cada fuente conserva su propio `EstadoIngesta`; las descargas comparten la
+    sesión HTTP. Una fuente que falla o no responde a tiempo no bloquea a las
+    demás: se sigue mostrando su última instantánea buena (o ninguna) y el
+    error queda en `errores`. Con `directorio` las instantáneas se guardan
+    en disco y se restauran al crear el objeto.
+    """
+    
+    def __init__(self, fuentes, directorio=None):
+        persistir = bool(directorio) and importlib.util.find_spec('pyarrow') is not None
+        self.estados = {
+            nombre: EstadoIngesta(fuente, os.path.join(directorio, re.sub(r'[^\w-]', '_', nombre)) if persistir else None)
+            for nombre, fuente in fuentes.items()
+        }
+        self.instantanea = None
+        self.errores = {}
+        self.ultima_carga = 0.0
+        self._versiones = None
+        self._futuros = {}
+        self._pool = concurrent.futures.ThreadPoolExecutor(len(self.estados), thread_name_prefix='ingesta')
+        if persistir:
+            self._publicar({nombre: estado for nombre, estado in self.estados.items() if estado.restaurar()})
+    
+    def _publicar(self, estados):
+        """Publica la unión de las instantáneas de `estados` si alguna cambió"""
+        disponibles = {nombre: estado.instantanea for nombre, estado in estados.items()}
+        if not disponibles:
+            return
+        versiones = {nombre: inst.version for nombre, inst in disponibles.items()}
+        if versiones != self._versiones:
+            self.instantanea = combinar_instantaneas(disponibles)
+            self._versiones = versiones
+        self.ultima_carga = max(estado.ultima_carga for estado in estados.values())
+    
+    def calidad_fechas(self):
+        """{nombre: CalidadFechas} de las fuentes con filas cuya fecha no se pudo leer"""
+        return {
+            nombre: estado.calidad_fechas
+            for nombre, estado in self.estados.items()
+            if estado.calidad_fechas.total_fallidas
+        }
+    
+    def _limite(self):
+        """Espera máxima del refresco: el timeout más largo entre las fuentes, más margen"""
+        timeouts = [getattr(estado.fuente, 'timeout', TIMEOUT_FUENTE) for estado in self.estados.values()]
+        return max(timeouts) + 30
+    
+    def actualizar(self):
+        """Refresca todas las fuentes a la vez y publica la unión si algo cambió"""
+        # Una fuente que sigue colgada del refresco anterior no se vuelve a encolar
+        futuros = {}
+        for nombre, estado in self.estados.items():
+            previo = self._futuros.get(nombre)
+            futuros[nombre] = previo if previo is not None and not previo.done() else self._pool.submit(estado.actualizar)
+        self._futuros = futuros
+        concurrent.futures.wait(futuros.values(), timeout=self._limite())
+        
+        errores = {}
+        for nombre, futuro in futuros.items():
+            if not futuro.done():
+                errores[nombre] = "sin respuesta a tiempo"
+            elif futuro.exception() is not None:
+                errores[nombre] = str(futuro.exception())
+        for nombre, error in errores.items():
+            logger.warning("Fuente %s: %s", nombre, error)
+        self.errores = errores
+        
+        disponibles = {nombre: estado for nombre, estado in self.estados.items() if estado.instantanea is not None}
+        if not disponibles:
+            raise RuntimeError('; '.join(f"{nombre}: {error}" for nombre, error in errores.items()))
+        self._publicar(disponibles)
+
+class Refrescador:
+    """Hilo de fondo que recarga la fuente cada `intervalo` segundos.
+
+    Las sesiones siempre leen la última instantánea publicada, sin esperar
+    a la descarga; el botón de actualizar solo adelanta el siguiente ciclo.
+    `despues(instantanea)`, si se da, corre tras cada refresco bueno en su
+    propio hilo (ej. precalcular las vistas de los meses cerrados).
+    """
+    
+    def __init__(self, estado, intervalo=TTL_REFRESCO, despues=None):
+        self.estado = estado
+        self.intervalo = intervalo
+        self.despues = despues
+        self.ultima_duracion = None
+        self.ultimo_error = None
+        self._despertar = threading.Event()
+        self._lock_primera_carga = threading.Lock()
+        self._hilo = threading.Thread(target=self._bucle, name='refrescador-datos', daemon=True)
+        self._posterior = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='refrescador-despues')
+    
+    def iniciar(self):
+        # Si ya hay una instantánea restaurada de disco, se refresca de inmediato en segundo plano
+        if self.estado.instantanea is not None:
+            self._despertar.set()
+        self._hilo.start()
+        return self
+    
+    def solicitar(self):
+        """Pide un refresco inmediato sin esperar a que termine"""
+        self._despertar.set()
+    
+    def asegurar_primera_carga(self):
+        """Carga en primer plano si todavía no hay ninguna instantánea"""
+        with self._lock_primera_carga:
+            if self.estado.instantanea is None:
+                self.refrescar()
+    
+    def refrescar(self):
+        inicio = time.perf_counter()
+        try:
+            self.estado.actualizar()
+            self.ultimo_error = None
+        except Exception as e:
+            self.ultimo_error = str(e)
+        self.ultima_duracion = time.perf_counter() - inicio
+        if self.despues is not None and self.ultimo_error is None:
+            self._posterior.submit(self._despues, self.estado.instantanea)
+    
+    def _despues(self, instantanea):
+        try:
+            self.despues(instantanea)
+        except Exception:
+            logger.exception("Falló la tarea posterior al refresco")
+    
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            self.refrescar()
+
+@perfilado
+def obtener_meses_disponibles(datos):
+    """Meses con datos, del más reciente al más antiguo, con sus errores y críticos.
+
+    Sale del catálogo de la instantánea (se arma una vez por instantánea y se
+    actualiza con cada ingesta), sin tocar las filas.
+    """
+    catalogo = datos.catalogo
+    return [
+        {'nombre': f"{MESES_ES.get(mes, mes)} {año}", 'año': año, 'mes': mes, 'filas': int(filas), 'criticos': int(criticos)}
+        for (año, mes), filas, criticos in zip(catalogo.index, catalogo['filas'], catalogo['criticos'])
+    ]
+
+# ============================================
+# TABLA PAGINADA
+# ============================================
+@perfilado
+def filas_explorador(periodo, tipo=None, consulta=''):
+    """Posiciones (en `periodo.df`) de las filas del período con el tipo y el texto dados"""
+    posiciones = periodo.posiciones
+    if tipo is not None:
+        posiciones = periodo.indice_valores('tipo_error').seleccionar(posiciones, [tipo])
+    
+    coincidencias = periodo.buscar(consulta) if consulta else None
+    if coincidencias is not None:
+        posiciones = np.intersect1d(posiciones, coincidencias, assume_unique=True)
+    return posiciones
+
+@perfilado
+def pagina_tabla(df, posiciones, columnas, orden=None, ascendente=True, pagina=0, tam=50):
+    """Materializa solo las filas de la página visible, opcionalmente ordenadas"""
+    if orden is not None:
+        valores = df[orden].take(posiciones).reset_index(drop=True)
+        posiciones = posiciones[
+            valores.sort_values(ascending=ascendente, kind='stable', na_position='last').index.to_numpy()
+        ]
+    
+    visibles = posiciones[pagina * tam:(pagina + 1) * tam]
+    filas = df.iloc[visibles, [df.columns.get_loc(c) for c in columnas]]
+    
+    # Sin esto cada página enviaría al navegador el diccionario completo de mensajes
+    for col in filas.columns:
+        if isinstance(filas[col].dtype, pd.CategoricalDtype):
+            filas[col] = filas[col].cat.remove_unused_categories()
+    return filas
+
+# ============================================
+# EXPORTACIÓN
+# ============================================
+FORMATOS_EXPORTACION = {
+    'CSV': ('.csv', 'text/csv'),
+    'CSV (gzip)': ('.csv.gz', 'application/gzip'),
+}
+if importlib.util.find_spec('pyarrow') is not None:  # Parquet es opcional
+    FORMATOS_EXPORTACION['Parquet'] = ('.parquet', 'application/vnd.apache.parquet')
+
+def exportar(df, posiciones, formato, ruta):
+    """Escribe las filas indicadas en `ruta`, bloque a bloque"""
+    bloques = (
+        df.iloc[posiciones[i:i + FILAS_POR_BLOQUE]]
+        for i in range(0, max(len(posiciones), 1), FILAS_POR_BLOQUE)
+    )
+    
+    if formato == 'Parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        escritor = None
+        for bloque in bloques:
+            tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(ruta, tabla.schema, compression='zstd')
+            escritor.write_table(tabla)
+        escritor.close()
+        return
+    
+    abrir = gzip.open if formato == 'CSV (gzip)' else open
+    with abrir(ruta, 'wt', encoding='utf-8', newline='') as f:
+        for i, bloque in enumerate(bloques):
+            bloque.to_csv(f, index=False, header=(i == 0))
+
+class CacheExportaciones:
+    """Archivos exportados en disco por clave de filtros (los más recientes).
+
+    La exportación se genera solo cuando alguien la descarga, y la misma
+    combinación de datos y filtros se sirve desde el archivo ya escrito.
+    Cada clave se exporta con su propio lock, así una exportación grande no
+    frena las descargas de las demás sesiones.
+    """
+    
+    def __init__(self, max_entradas=8):
+        self.directorio = tempfile.mkdtemp(prefix='proa_export_')
+        self.max_entradas = max_entradas
+        self.rutas = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self._cargas = {}
+    
+    def _ruta(self, clave, df, posiciones, formato):
+        """Ruta del archivo exportado para `clave`; si varias sesiones lo piden
+        a la vez, una lo escribe y las demás esperan"""
+        with self.lock:
+            if clave in self.rutas:
+                self.rutas.move_to_end(clave)
+                return self.rutas[clave]
+            carga = self._cargas.setdefault(clave, threading.Lock())
+        
+        with carga:
+            with self.lock:
+                if clave in self.rutas:
+                    return self.rutas[clave]
+            extension = FORMATOS_EXPORTACION[formato][0]
+            ruta = os.path.join(self.directorio, hashlib.blake2b(repr(clave).encode()).hexdigest()[:24] + extension)
+            exportar(df, posiciones, formato, ruta)
+            with self.lock:
+                self.rutas[clave] = ruta
+                viejas = []
+                while len(self.rutas) > self.max_entradas:
+                    viejas.append(self.rutas.popitem(last=False)[1])
+                self._cargas.pop(clave, None)
+        for vieja in viejas:
+            os.remove(vieja)
+        return ruta
+    
+    def abrir(self, clave, df, posiciones, formato):
+        """Contenido del archivo exportado.
+
+        Streamlit lee completa la descarga diferida antes de enviarla, así
+        que se devuelven los bytes y el archivo queda cerrado.
+        """
+        while True:
+            ruta = self._ruta(clave, df, posiciones, formato)
+            try:
+                with open(ruta, 'rb') as archivo:
+                    return archivo.read()
+            except FileNotFoundError:
+                # Otra sesión lo desalojó entre `_ruta` y la lectura
+                with self.lock:
+                    if self.rutas.get(clave) == ruta:
+                        del self.rutas[clave]
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+🏥 DASHBOARD DE ERRORES API - PERFILADO
+=======================================
+Instrumentación opcional por etapa (tiempo, filas procesadas y tamaño del
+payload) para saber si la lentitud viene de la descarga, el parseo, los
+filtros, la construcción de figuras o el envío al navegador.
+
+Autor: Lizbeth Ramírez | PROA - Ecommerce
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import marshal
+import pstats
+import time
+import uuid
+
+import pandas as pd
+
+logger = logging.getLogger('proa.perfilado')
+
+_perfilador_actual = contextvars.ContextVar('perfilador_actual', default=None)
+
+class Perfilador:
+    """Registro de las etapas de un rerun; inactivo no mide nada"""
+    
+    def __init__(self, activo=True):
+        self.activo = activo
+        self.rerun = uuid.uuid4().hex[:8]
+        self.etapas = []
+    
+    @contextlib.contextmanager
+    def activar(self):
+        """Hace que las funciones decoradas con `@perfilado` reporten aquí"""
+        token = _perfilador_actual.set(self if self.activo else None)
+        try:
+            yield self
+        finally:
+            _perfilador_actual.reset(token)
+    
+    @contextlib.contextmanager
+    def etapa(self, nombre, filas=None):
+        """Mide el bloque; el registro admite completar `filas` o `bytes` después"""
+        registro = {'etapa': nombre, 'ms': None, 'filas': filas, 'bytes': None}
+        if not self.activo:
+            yield registro
+            return
+        
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro['ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+            self.etapas.append(registro)
+    
+    def tabla(self):
+        return pd.DataFrame(self.etapas, columns=['etapa', 'ms', 'filas', 'bytes'])
+    
+    def emitir_logs(self):
+        """Una línea JSON por etapa en el logger `proa.perfilado`"""
+        for registro in self.etapas:
+            logger.info(json.dumps({'evento': 'etapa', 'rerun': self.rerun, **registro}, ensure_ascii=False))
+
+def perfilado(funcion):
+    """Decorador: registra cada llamada como etapa del perfilador activo, si hay uno"""
+    
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        perfilador = _perfilador_actual.get()
+        if perfilador is None:
+            return funcion(*args, **kwargs)
+        
+        filas = len(args[0]) if args and hasattr(args[0], '__len__') else None
+        with perfilador.etapa(funcion.__name__, filas=filas):
+            return funcion(*args, **kwargs)
+    
+    return envoltura
+
+def tamaño_payload(objeto):
+    """Bytes aproximados que se envían al navegador por una figura o un DataFrame"""
+    if objeto is None:
+        return 0
+    if hasattr(objeto, 'to_json') and hasattr(objeto, 'layout'):
+        return len(objeto.to_json().encode('utf-8'))
+    if isinstance(objeto, pd.DataFrame):
+        return int(objeto.memory_usage(index=True, deep=True).sum())
+    return len(str(objeto).encode('utf-8'))
+
+@contextlib.contextmanager
+def capturar_cprofile(activo):
+    """Perfil de cProfile del bloque; al salir el dict trae el texto y el .prof"""
+    resultado = {}
+    if not activo:
+        yield resultado
+        return
+    
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield resultado
+    finally:
+        perfil.disable()
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats('cumulative').print_stats(30)
+        resultado['texto'] = texto.getvalue()
+        perfil.create_stats()
+        resultado['prof'] = marshal.dumps(perfil.stats)  # mismo formato que dump_stats
+
+def configurar_logs():
+    """Asegura que los logs de perfilado salgan por stderr"""
+    if not logger.handlers:
+        manejador = logging.StreamHandler()
+        manejador.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        logger.addHandler(manejador)
+    logger.setLevel(logging.INFO)
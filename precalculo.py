@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+🏥 DASHBOARD DE ERRORES API - VISTAS PRECALCULADAS
+==================================================
+Los meses cerrados no cambian: un proceso batch deja lista la vista de cada
+uno (KPIs, métricas del resumen, top de mensajes y figuras serializadas) y
+el dashboard la sirve tal cual; solo el mes en curso se calcula en vivo.
+Cada vista lleva la huella del contenido de su mes, así que solo se rehace
+cuando le llegan filas atrasadas.
+
+El dashboard corre el batch tras cada refresco; también se puede correr a
+mano con las mismas variables de entorno que el dashboard:
+
+    python precalculo.py
+    python precalculo.py --procesos 4
+
+Autor: Lizbeth Ramírez | PROA - Ecommerce
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import glob
+import logging
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+
+import plotly.io as pio
+
+import graficos
+from nucleo import (
+    DIR_INSTANTANEAS,
+    FUENTES_DATOS,
+    IngestaMultiple,
+    Instantanea,
+    crear_fuentes,
+    filtrar_cubo,
+    kpis,
+    metricas_resumen,
+    rango_fechas_cubo,
+)
+
+logger = logging.getLogger(__name__)
+
+# Carpeta de las vistas; el '.' no puede aparecer en el nombre de una fuente
+DIR_VISTAS = os.path.join(DIR_INSTANTANEAS, 'vistas.d') if DIR_INSTANTANEAS else ''
+
+# Formato de las vistas guardadas; cambiarlo las descarta
+VERSION_VISTAS = 2
+
+# Severidades que el dashboard elige por defecto; la vista muestra lo mismo
+# que la vista en vivo con ellas (las filas sin severidad quedan fuera)
+SEVERIDADES_VISTA = ['CRITICA', 'ALTA', 'MEDIA', 'BAJA']
+
+# Vistas ya cargadas que se mantienen en memoria
+MAX_VISTAS_EN_MEMORIA = 24
+
+def ruta_vista(directorio, año, mes, huella):
+    return os.path.join(directorio, f'{año}-{mes:02d}.{huella}.pkl')
+
+# ============================================
+# CONSTRUCCIÓN
+# ============================================
+def construir_vista(datos, año, mes):
+    """Todo lo que muestra el dashboard de un mes con los filtros por defecto, con las figuras en JSON"""
+    cubo = filtrar_cubo(datos.cubo, año=año, mes=mes, severidades=SEVERIDADES_VISTA)
+    anomalias = datos.anomalias_periodo(año, mes)
+    top, error = datos.mas_frecuentes(20, año, mes, SEVERIDADES_VISTA)
+    figuras = {
+        'grafico_tendencia_diaria': graficos.grafico_tendencia_diaria(cubo, anomalias),
+        'grafico_severidad': graficos.grafico_severidad(cubo),
+        'grafico_por_tipo': graficos.grafico_por_tipo(cubo),
+        'grafico_mensajes_error': graficos.grafico_mensajes_error(top.head(10), error),
+        'grafico_por_hora': graficos.grafico_por_hora(cubo, anomalias),
+    }
+    return {
+        'formato': VERSION_VISTAS,
+        'huella': datos.huella_mes(año, mes),
+        'kpis': kpis(cubo),
+        'metricas': metricas_resumen(cubo),
+        'rango': rango_fechas_cubo(cubo),
+        'top': (top, error),
+        'figuras': {nombre: fig.to_json() for nombre, fig in figuras.items() if fig},
+    }
+
+def _precalcular_mes(ruta, año, mes, particiones, cubo, anomalias):
+    """Tarea de un proceso del pool: arma y guarda la vista de un mes"""
+    datos = Instantanea(particiones, cubo, anomalias=anomalias)
+    vista = construir_vista(datos, año, mes)
+    with open(ruta + '.tmp', 'wb') as f:
+        pickle.dump(vista, f)
+    os.replace(ruta + '.tmp', ruta)
+    return ruta
+
+def precalcular(datos, directorio=DIR_VISTAS, procesos=None):
+    """Vistas de los meses cerrados que no tienen una con su huella actual.
+    
+    Cada mes va a un proceso del pool con solo sus partes y su rebanada del
+    cubo; las vistas viejas de esos meses se borran. Devuelve los meses hechos.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    pendientes = {}
+    for año, mes in datos.meses_cerrados():
+        ruta = ruta_vista(directorio, año, mes, datos.huella_mes(año, mes))
+        if not os.path.exists(ruta):
+            pendientes[(año, mes)] = ruta
+    if not pendientes:
+        return []
+    
+    # spawn: el dashboard tiene hilos vivos y no conviene hacer fork
+    contexto = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(procesos, mp_context=contexto) as pool:
+        futuros = {
+            pool.submit(
+                _precalcular_mes, ruta, año, mes,
+                {(año, mes): datos.particiones[(año, mes)]},
+                filtrar_cubo(datos.cubo, año=año, mes=mes),
+                datos.anomalias_periodo(año, mes),
+            ): (año, mes)
+            for (año, mes), ruta in pendientes.items()
+        }
+        hechos = []
+        for futuro in concurrent.futures.as_completed(futuros):
+            año, mes = futuros[futuro]
+            try:
+                futuro.result()
+            except Exception:
+                logger.exception("No se pudo precalcular %d-%02d", año, mes)
+                continue
+            hechos.append((año, mes))
+            vigente = pendientes[(año, mes)]
+            for vieja in glob.glob(ruta_vista(directorio, año, mes, '*')):
+                if vieja != vigente:
+                    os.remove(vieja)
+    return sorted(hechos)
+
+# ============================================
+# LECTURA
+# ============================================
+class VistasMes:
+    """Vistas precalculadas leídas de disco, con las figuras ya deserializadas (LRU)"""
+    
+    def __init__(self, directorio=DIR_VISTAS, max_vistas=MAX_VISTAS_EN_MEMORIA):
+        self.directorio = directorio
+        self.max_vistas = max_vistas
+        self._vistas = collections.OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obtener(self, año, mes, huella):
+        """La vista del mes con esa huella, o None si no hay (se calcula en vivo)"""
+        clave = (año, mes, huella)
+        with self._lock:
+            if clave in self._vistas:
+                self._vistas.move_to_end(clave)
+                return self._vistas[clave]
+        if not self.directorio:
+            return None
+        
+        try:
+            with open(ruta_vista(self.directorio, año, mes, huella), 'rb') as f:
+                vista = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.exception("Vista ilegible de %d-%02d; se calcula en vivo", año, mes)
+            return None
+        if vista.get('formato') != VERSION_VISTAS:
+            return None
+        vista['figuras'] = {nombre: pio.from_json(texto) for nombre, texto in vista['figuras'].items()}
+        
+        with self._lock:
+            self._vistas[clave] = vista
+            while len(self._vistas) > self.max_vistas:
+                self._vistas.popitem(last=False)
+        return vista
+
+# ============================================
+# CLI
+# ============================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precalcula las vistas de los meses cerrados")
+    parser.add_argument('--directorio', default=DIR_VISTAS,
+                        help="dónde guardar las vistas (por defecto junto a las instantáneas)")
+    parser.add_argument('--procesos', type=int, help="procesos del pool (por defecto uno por núcleo)")
+    args = parser.parse_args(argv)
+    if not args.directorio:
+        parser.error("sin DASHBOARD_DIR_INSTANTANEAS hay que indicar --directorio")
+    
+    # Ingesta propia en memoria: las huellas dependen solo del contenido, así
+    # que coinciden con las del dashboard sin tocar su carpeta de instantáneas
+    ingesta = IngestaMultiple(crear_fuentes(FUENTES_DATOS))
+    ingesta.actualizar()
+    hechos = precalcular(ingesta.instantanea, args.directorio, args.procesos)
+    print(f"{len(hechos)} vista(s) precalculada(s) en {args.directorio}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())